@@ -0,0 +1,105 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from plugins.napcat_plugin.ada.config import global_config
+
+
+class TTLCache:
+    """
+    带过期时间和容量上限的LRU缓存
+
+    超出容量时淘汰最久未使用的条目。过期条目不会被get返回，但会保留到被覆盖或淘汰，
+    在Napcat请求失败时可通过get_stale取得旧数据作为降级；被invalidate的条目则会立即删除。
+    """
+
+    def __init__(self, name: str, ttl: float, max_size: int):
+        self.name = name
+        self.ttl = ttl
+        self.max_size = max_size
+        self._data: OrderedDict[Hashable, Tuple[float, Any]] = OrderedDict()
+        self.hits: int = 0
+        self.misses: int = 0
+        self.stale_hits: int = 0
+        """请求失败时使用过期数据的次数"""
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """获取缓存值，不存在或已过期时返回None"""
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        expire_time, value = item
+        if expire_time < time.monotonic():
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        """查看缓存值，不更新LRU顺序与命中统计"""
+        item = self._data.get(key)
+        if item is None or item[0] < time.monotonic():
+            return None
+        return item[1]
+
+    def get_stale(self, key: Hashable) -> Optional[Any]:
+        """获取缓存值，包括已过期的条目，用于请求失败时的降级"""
+        item = self._data.get(key)
+        if item is None:
+            return None
+        self.stale_hits += 1
+        return item[1]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        if self.max_size <= 0 or self.ttl <= 0:
+            return
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        """使某个条目失效"""
+        self._data.pop(key, None)
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> None:
+        """使所有key满足条件的条目失效，需要遍历整个缓存，仅用于低频事件"""
+        for key in [key for key in self._data if predicate(key)]:
+            del self._data[key]
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取命中统计"""
+        total = self.hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale_hits": self.stale_hits,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+
+group_info_cache = TTLCache(
+    "group_info",
+    ttl=global_config.cache.group_info_ttl,
+    max_size=global_config.cache.group_info_max_size,
+)
+"""group_id -> get_group_info 返回的数据"""
+
+member_info_cache = TTLCache(
+    "member_info",
+    ttl=global_config.cache.member_info_ttl,
+    max_size=global_config.cache.member_info_max_size,
+)
+"""(group_id, user_id) -> get_member_info 返回的数据"""
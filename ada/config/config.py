@@ -12,11 +12,16 @@ from rich.traceback import install
 
 from plugins.napcat_plugin.ada.config.config_base import ConfigBase
 from plugins.napcat_plugin.ada.config.official_configs import (
+    CacheConfig,
     ChatConfig,
     DebugConfig,
+    DiagnosticsConfig,
+    DispatchConfig,
     MaiBotServerConfig,
+    MediaConfig,
     NapcatServerConfig,
     NicknameConfig,
+    RpcConfig,
     VoiceConfig,
 )
 
@@ -117,6 +122,11 @@ class Config(ConfigBase):
     maibot_server: MaiBotServerConfig
     chat: ChatConfig
     voice: VoiceConfig
+    cache: CacheConfig
+    media: MediaConfig
+    dispatch: DispatchConfig
+    rpc: RpcConfig
+    diagnostics: DiagnosticsConfig
     debug: DebugConfig
 
 
@@ -107,6 +107,9 @@ class ConfigBase:
 
         # 处理int, str, float, bool等基础类型
         if field_origin_type is None:
+            # TOML中写作整数的值（如 timeout = 0）同样可以作为浮点数
+            if field_type is float and isinstance(value, int) and not isinstance(value, bool):
+                return float(value)
             if isinstance(value, field_type):
                 return field_type(value)
             else:
@@ -31,6 +31,12 @@ class NapcatServerConfig(ConfigBase):
     heartbeat_interval: int = 30
     """Napcat心跳间隔时间，单位为秒"""
 
+    replay_timeout: float = 15.0
+    """连接断开期间发出的只读请求等待Napcat重新连接的最长时间（秒），连接恢复后重新发送，设为0则直接失败"""
+
+    replay_queue_size: int = 200
+    """同时等待重新连接的只读请求数上限，超过的请求直接失败"""
+
 
 @dataclass
 class MaiBotServerConfig(ConfigBase):
@@ -74,7 +80,112 @@ class VoiceConfig(ConfigBase):
     """是否启用TTS功能"""
 
 
+@dataclass
+class CacheConfig(ConfigBase):
+    group_info_ttl: int = 300
+    """群信息缓存有效期，单位为秒，设为0则关闭缓存"""
+
+    group_info_max_size: int = 1000
+    """群信息缓存最多保存的群数量"""
+
+    member_info_ttl: int = 120
+    """群成员信息缓存有效期，单位为秒，设为0则关闭缓存"""
+
+    member_info_max_size: int = 5000
+    """群成员信息缓存最多保存的成员数量"""
+
+    bot_verdict_ttl: int = 86400
+    """机器人判定结果的复查间隔，单位为秒，过期后仍使用旧结果并在后台重新判定"""
+
+
+@dataclass
+class MediaConfig(ConfigBase):
+    download_timeout: int = 10
+    """单个媒体文件的下载超时时间，单位为秒"""
+
+    max_download_bytes: int = 20971520
+    """单个媒体文件的最大字节数，超过则放弃下载"""
+
+    connection_limit: int = 32
+    """下载连接池的总连接数上限"""
+
+    per_host_limit: int = 4
+    """对同一主机的最大并发下载数"""
+
+    forward_download_concurrency: int = 4
+    """单条合并转发消息中同时下载的图片数"""
+
+    memory_cache_bytes: int = 67108864
+    """媒体内存缓存的最大字节数，设为0则关闭内存缓存"""
+
+    disk_cache_bytes: int = 536870912
+    """媒体磁盘缓存（data/media_cache）的最大字节数，设为0则关闭磁盘缓存"""
+
+    image_workers: int = 2
+    """图片格式转换线程池的大小"""
+
+    image_task_timeout: int = 10
+    """单次图片格式转换的超时时间，单位为秒，超时则发送原图"""
+
+
+@dataclass
+class DispatchConfig(ConfigBase):
+    worker_count: int = 8
+    """并行处理事件的worker数，同一群/私聊的事件始终由同一个worker按顺序处理"""
+
+    starvation_limit: int = 8
+    """高优先级会话连续插队的次数上限，超过后强制处理队头事件等待最久的会话"""
+
+    shard_queue_size: int = 500
+    """每个分片最多积压的事件数，设为0则不限制；元事件与通知不受限制"""
+
+    overflow_policy: Literal["drop_oldest_ambient", "drop_media_first", "block"] = "drop_oldest_ambient"
+    """分片队列满时的处理策略"""
+
+    block_timeout: float = 5.0
+    """block策略下最长的等待时间，单位为秒，超时则丢弃新事件"""
+
+
+@dataclass
+class RpcConfig(ConfigBase):
+    adaptive_timeout: bool = True
+    """是否根据每种请求最近的响应耗时自动调整超时时间"""
+
+    timeout_floor: float = 2.0
+    """自动调整后的超时时间下限（秒），上限为各请求原有的超时时间"""
+
+    timeout_multiplier: float = 4.0
+    """超时时间为最近响应耗时p99的多少倍"""
+
+    breaker_threshold: int = 5
+    """同一种请求连续超时多少次后熔断，熔断期间该请求直接失败，设为0则不熔断"""
+
+    breaker_open_seconds: float = 10.0
+    """熔断持续时间（秒），之后放行一个试探请求，成功则恢复"""
+
+
+@dataclass
+class DiagnosticsConfig(ConfigBase):
+    enable: bool = False
+    """是否开启诊断HTTP接口"""
+
+    host: str = "127.0.0.1"
+    """诊断接口监听的地址"""
+
+    port: int = 8097
+    """诊断接口监听的端口"""
+
+
 @dataclass
 class DebugConfig(ConfigBase):
     level: Literal["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"] = "INFO"
     """日志级别，默认为INFO"""
+
+    sample_every: int = 100
+    """高频调试日志（如收到的原始数据）每多少条输出1条，设为1则全部输出"""
+
+    capture_file: str = ""
+    """非空时将与Napcat之间收发的所有数据记录到该文件（gzip压缩的JSONL），用于回放测试"""
+
+    slow_trace_threshold: float = 3.0
+    """单条事件/回复的处理总耗时超过该值（秒）时输出各阶段耗时，设为0则不输出"""
@@ -0,0 +1,129 @@
+import asyncio
+import time
+from typing import Any, Dict, Optional
+
+import websockets as Server
+
+from plugins.napcat_plugin.ada.config import global_config
+from plugins.napcat_plugin.ada.logger import logger
+from plugins.napcat_plugin.ada.response_pool import fail_pending_responses
+
+READ_ONLY_ACTIONS = frozenset({"can_send_image", "can_send_record"})
+"""不以get_开头、但同样没有副作用的请求"""
+
+
+class NapcatConnectionClosed(ConnectionError):
+    """与Napcat的连接已断开，请求不会再收到响应"""
+
+
+def is_idempotent(action: str) -> bool:
+    """判断请求是否为只读查询，只读查询在连接恢复后可以安全地重新发送"""
+    return action.startswith("get_") or action in READ_ONLY_ACTIONS
+
+
+class ConnectionSupervisor:
+    """
+    管理adapter与Napcat之间的当前连接
+
+    adapter是WebSocket服务端，断线后由Napcat主动重连，这里负责：
+    - 连接断开时让该连接上等待响应的请求立即以NapcatConnectionClosed失败，而不是各自等到超时
+    - 断线期间发出的只读请求等待新连接建立后重新发送，等待时间与等待数量都有上限
+    - 心跳超时时主动关闭已失去响应的连接，促使Napcat重连
+    """
+
+    def __init__(self):
+        self.connection: Optional[Server.ServerConnection] = None
+        self._changed = asyncio.Event()
+        """连接变化时set并替换为新的Event"""
+        self.connected_at: Optional[float] = None
+        self.disconnected_at: Optional[float] = None
+        self.disconnect_count: int = 0
+        self.failed_on_disconnect: int = 0
+        """因连接断开而立即失败的请求数"""
+        self.replay_waiting: int = 0
+        """正在等待新连接的只读请求数"""
+        self.replayed: int = 0
+        self.replay_rejected: int = 0
+        """等待超时或等待数量超限而失败的只读请求数"""
+        self.closed = False
+        """adapter正在关闭，不再等待重连"""
+
+    def _notify_changed(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def attach(self, connection: Server.ServerConnection) -> None:
+        """Napcat建立连接时调用"""
+        if self.disconnected_at is not None:
+            logger.info(f"Napcat已重新连接，距断开 {time.time() - self.disconnected_at:.1f} 秒")
+        self.connection = connection
+        self.connected_at = time.time()
+        self.closed = False
+        self._notify_changed()
+
+    def detach(self, connection: Server.ServerConnection) -> None:
+        """连接断开时调用，让该连接上等待响应的请求立即失败"""
+        failed = fail_pending_responses(connection, NapcatConnectionClosed("与Napcat的连接已断开"))
+        self.failed_on_disconnect += failed
+        if self.connection is not connection:
+            return
+        self.connection = None
+        self.disconnected_at = time.time()
+        self.disconnect_count += 1
+        logger.warning(f"与Napcat的连接已断开，{failed} 个等待中的请求已立即失败，等待Napcat重连")
+        self._notify_changed()
+
+    async def close_stale(self, connection: Optional[Server.ServerConnection], reason: str) -> None:
+        """主动关闭失去响应的连接，连接的读取循环结束后会调用detach"""
+        if connection is None or connection is not self.connection:
+            return
+        logger.warning(f"{reason}，主动断开与Napcat的连接")
+        await connection.close(code=1011, reason=reason)
+
+    async def wait_for_connection(self, stale: Optional[Any] = None) -> Server.ServerConnection:
+        """
+        等待一个可用的连接，stale为已知失效的连接，不会被返回
+
+        等待时间与同时等待的数量受replay_timeout与replay_queue_size限制，超出时抛出NapcatConnectionClosed
+        """
+        if self.connection is not None and self.connection is not stale:
+            return self.connection
+        timeout = global_config.napcat_server.replay_timeout
+        if self.closed or timeout <= 0 or self.replay_waiting >= global_config.napcat_server.replay_queue_size:
+            self.replay_rejected += 1
+            raise NapcatConnectionClosed("与Napcat的连接已断开")
+        self.replay_waiting += 1
+        deadline = time.monotonic() + timeout
+        try:
+            while self.connection is None or self.connection is stale:
+                if self.closed:
+                    raise NapcatConnectionClosed("adapter正在关闭")
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError
+                await asyncio.wait_for(self._changed.wait(), remaining)
+            return self.connection
+        except TimeoutError:
+            self.replay_rejected += 1
+            raise NapcatConnectionClosed(f"与Napcat的连接在 {timeout} 秒内未恢复") from None
+        finally:
+            self.replay_waiting -= 1
+
+    def close(self) -> None:
+        """adapter关闭时调用，正在等待重连的请求立即失败"""
+        self.closed = True
+        self._notify_changed()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "connected": self.connection is not None,
+            "connected_seconds": round(time.time() - self.connected_at, 1) if self.connection else None,
+            "disconnect_count": self.disconnect_count,
+            "failed_on_disconnect": self.failed_on_disconnect,
+            "replay_waiting": self.replay_waiting,
+            "replayed": self.replayed,
+            "replay_rejected": self.replay_rejected,
+        }
+
+
+connection_supervisor = ConnectionSupervisor()
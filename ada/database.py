@@ -1,5 +1,6 @@
 import os
-from typing import Optional, List
+import threading
+from typing import Optional, List, Dict, Tuple
 from dataclasses import dataclass
 from sqlmodel import Field, Session, SQLModel, create_engine, select
 
@@ -36,6 +37,16 @@ class DB_BanUser(SQLModel, table=True):
     lift_time: Optional[int]  # 禁言解除的时间（时间戳）
 
 
+class DB_BotVerdict(SQLModel, table=True):
+    """
+    表示数据库中的机器人判定记录。
+    """
+
+    user_id: int = Field(primary_key=True)  # 用户 ID
+    is_bot: bool  # 是否为QQ官方机器人
+    checked_time: int  # 最近一次判定的时间（时间戳）
+
+
 def is_identical(obj1: BanUser, obj2: BanUser) -> bool:
     """
     检查两个 BanUser 对象是否相同。
@@ -53,6 +64,7 @@ class DatabaseManager:
         DATABASE_FILE = os.path.join(os.path.dirname(__file__), "..", "data", "NapcatAdapter.db")
         self.sqlite_url = f"sqlite:///{DATABASE_FILE}"  # SQLite 数据库 URL
         self.engine = create_engine(self.sqlite_url, echo=False)  # 创建数据库引擎
+        self._verdict_lock = threading.Lock()  # set_bot_verdict会在线程池中并发执行
         self._ensure_database()  # 确保数据库和表已创建
 
     def _ensure_database(self) -> None:
@@ -158,5 +170,31 @@ class DatabaseManager:
             else:
                 logger.info(f"未找到禁言记录: user_id: {user_id}, group_id: {group_id}")
 
+    def get_bot_verdicts(self) -> Dict[int, Tuple[bool, int]]:
+        """
+        读取所有机器人判定记录。
+        Returns:
+            Dict[int, Tuple[bool, int]]: user_id -> (是否为机器人, 判定时间)
+        """
+        with Session(self.engine) as session:
+            records = session.exec(select(DB_BotVerdict)).all()
+            return {item.user_id: (item.is_bot, item.checked_time) for item in records}
+
+    def set_bot_verdict(self, user_id: int, is_bot: bool, checked_time: int) -> None:
+        """
+        创建或更新用户的机器人判定记录。
+        会提交事务，在事件循环中请通过 asyncio.to_thread 调用。
+        """
+        with self._verdict_lock, Session(self.engine) as session:
+            existing_record = session.get(DB_BotVerdict, user_id)
+            if existing_record:
+                existing_record.is_bot = is_bot
+                existing_record.checked_time = checked_time
+                session.add(existing_record)
+            else:
+                session.add(DB_BotVerdict(user_id=user_id, is_bot=is_bot, checked_time=checked_time))
+            session.commit()
+            logger.debug(f"更新机器人判定记录: user_id: {user_id}, is_bot: {is_bot}")
+
 
 db_manager = DatabaseManager()
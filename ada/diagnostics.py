@@ -0,0 +1,234 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from aiohttp import web
+
+from plugins.napcat_plugin.ada.config import global_config
+from plugins.napcat_plugin.ada.logger import logger
+from plugins.napcat_plugin.ada.cache import group_info_cache, member_info_cache
+from plugins.napcat_plugin.ada.media_cache import media_cache
+from plugins.napcat_plugin.ada.request_coalescer import request_coalescer
+from plugins.napcat_plugin.ada.response_pool import response_dict, response_time_dict
+from plugins.napcat_plugin.ada.rpc_guard import rpc_guard
+from plugins.napcat_plugin.ada.rpc_metrics import escape_label_value, format_ms, handler_metrics, rpc_metrics
+from plugins.napcat_plugin.ada.tracing import trace_metrics
+from plugins.napcat_plugin.ada.connection_supervisor import connection_supervisor
+from plugins.napcat_plugin.ada.recv_handler.meta_event_handler import meta_event_handler
+from plugins.napcat_plugin.ada.recv_handler.notice_handler import notice_queue, unsuccessful_notice_queue
+
+
+class EventLoopLagMonitor:
+    """
+    事件循环延迟监测
+
+    每隔interval秒sleep一次，实际醒来时间与预期的差值即为事件循环被阻塞的时长。
+    """
+
+    def __init__(self, interval: float = 0.5, window: int = 120):
+        self.interval = interval
+        self.samples: Deque[float] = deque(maxlen=window)
+        """最近window次的延迟，单位为秒"""
+        self.max_lag: float = 0.0
+
+    async def run(self) -> None:
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - expected)
+            self.samples.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        if not self.samples:
+            return {"last_ms": None, "window_max_ms": None, "max_ms": None}
+        return {
+            "last_ms": round(self.samples[-1] * 1000, 2),
+            "window_max_ms": round(max(self.samples) * 1000, 2),
+            "max_ms": round(self.max_lag * 1000, 2),
+        }
+
+
+loop_lag_monitor = EventLoopLagMonitor()
+
+
+def collect_diagnostics(adapter) -> Dict[str, Any]:
+    """
+    汇总adapter内部状态
+    Parameters:
+        adapter: NapcatAdapter实例，用于读取事件分发器的状态
+    """
+    last_heart_beat: Optional[float] = getattr(meta_event_handler, "last_heart_beat", None)
+    return {
+        "dispatch": {
+            "shard_depths": adapter.dispatcher.queue_depths(),
+            "lane_depths": adapter.dispatcher.lane_depths(),
+            "shed_counts": adapter.dispatcher.shed_counts(),
+        },
+        "response_pool": {
+            "waiting": len(response_dict) - len(response_time_dict),
+            "unclaimed": len(response_time_dict),
+        },
+        "notice_queue": {
+            "pending": notice_queue.qsize(),
+            "unsuccessful": unsuccessful_notice_queue.qsize(),
+        },
+        "connection": connection_supervisor.stats(),
+        "heartbeat_age_seconds": round(time.time() - last_heart_beat, 1) if last_heart_beat else None,
+        "event_loop_lag": loop_lag_monitor.stats(),
+        "caches": [group_info_cache.stats(), member_info_cache.stats(), media_cache.stats()],
+        "request_coalescer": request_coalescer.stats(),
+        "rpc": rpc_metrics.snapshot(),
+        "rpc_guard": rpc_guard.stats(),
+        "handlers": handler_metrics.snapshot(),
+        "trace_stages": trace_metrics.snapshot(),
+    }
+
+
+def render_prometheus(diagnostics: Dict[str, Any]) -> str:
+    """将collect_diagnostics的结果与请求/事件处理/处理阶段直方图导出为Prometheus文本格式"""
+    lines = []
+
+    def gauge(name: str, help_text: str, samples: Dict[str, Any], label: Optional[str] = None) -> None:
+        """label为None时为无标签的单个值，samples中只有一项"""
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        for key, value in samples.items():
+            if value is None:
+                continue
+            labels = f'{{{label}="{escape_label_value(key)}"}}' if label else ""
+            lines.append(f"{name}{labels} {value}")
+
+    dispatch = diagnostics["dispatch"]
+    gauge("napcat_dispatch_shard_depth", "每个分片积压的事件数", dispatch["shard_depths"], "shard")
+    gauge("napcat_dispatch_lane_depth", "每个优先级通道积压的事件数", dispatch["lane_depths"], "lane")
+    lines.append("# HELP napcat_dispatch_shed_total 队列已满被丢弃的事件数")
+    lines.append("# TYPE napcat_dispatch_shed_total counter")
+    for key, value in dispatch["shed_counts"].items():
+        policy, _, reason = key.partition(":")
+        lines.append(f'napcat_dispatch_shed_total{{policy="{policy}",reason="{reason}"}} {value}')
+    gauge("napcat_response_pool_size", "响应池中的条目数", diagnostics["response_pool"], "state")
+    gauge("napcat_notice_queue_depth", "待发送给MaiBot的通知数", diagnostics["notice_queue"], "queue")
+    connection = diagnostics["connection"]
+    gauge("napcat_connected", "是否已与Napcat连接", {"": int(connection["connected"])})
+    gauge("napcat_replay_waiting", "等待Napcat重连后重新发送的只读请求数", {"": connection["replay_waiting"]})
+    lines.append("# HELP napcat_connection_events_total 连接断开相关的事件数")
+    lines.append("# TYPE napcat_connection_events_total counter")
+    for key in ("disconnect_count", "failed_on_disconnect", "replayed", "replay_rejected"):
+        lines.append(f'napcat_connection_events_total{{event="{key}"}} {connection[key]}')
+    gauge("napcat_heartbeat_age_seconds", "距上次收到Napcat心跳的时间", {"": diagnostics["heartbeat_age_seconds"]})
+    lag = diagnostics["event_loop_lag"]
+    gauge(
+        "napcat_event_loop_lag_seconds",
+        "事件循环延迟",
+        {key.removesuffix("_ms"): value / 1000 for key, value in lag.items() if value is not None},
+        "window",
+    )
+    caches = diagnostics["caches"]
+    gauge("napcat_cache_hit_ratio", "缓存命中率", {cache["name"]: cache["hit_ratio"] for cache in caches}, "cache")
+    gauge(
+        "napcat_cache_entries",
+        "缓存条目数",
+        {cache["name"]: cache.get("size", cache.get("memory_entries")) for cache in caches},
+        "cache",
+    )
+    rpc_guard_stats = diagnostics["rpc_guard"]
+    gauge(
+        "napcat_rpc_timeout_seconds",
+        "根据最近耗时计算出的请求超时时间",
+        {action: guard["timeout_seconds"] for action, guard in rpc_guard_stats.items()},
+        "action",
+    )
+    gauge(
+        "napcat_rpc_breaker_open",
+        "请求是否处于熔断状态（半开也计为1）",
+        {action: int(guard["state"] != "closed") for action, guard in rpc_guard_stats.items()},
+        "action",
+    )
+    lines.append("# HELP napcat_rpc_breaker_rejected_total 熔断期间直接失败的请求数")
+    lines.append("# TYPE napcat_rpc_breaker_rejected_total counter")
+    for action, guard in rpc_guard_stats.items():
+        lines.append(f'napcat_rpc_breaker_rejected_total{{action="{escape_label_value(action)}"}} {guard["rejected"]}')
+    gauge("napcat_coalescer_in_flight", "合并中的在途查询数", {"": diagnostics["request_coalescer"]["in_flight"]})
+    return (
+        "\n".join(lines)
+        + "\n"
+        + rpc_metrics.render_prometheus()
+        + handler_metrics.render_prometheus()
+        + trace_metrics.render_prometheus()
+    )
+
+
+def log_stats() -> None:
+    """输出请求合并、缓存与Napcat请求的统计"""
+    coalescer_stats = request_coalescer.stats()
+    logger.info(
+        f"请求合并统计: 共 {coalescer_stats['total_calls']} 次查询，"
+        f"合并 {coalescer_stats['deduplicated_calls']} 次 ({coalescer_stats['dedup_ratio']:.1%})"
+    )
+    for cache in (group_info_cache, member_info_cache):
+        cache_stats = cache.stats()
+        logger.info(
+            f"缓存 {cache_stats['name']}: {cache_stats['size']}/{cache_stats['max_size']} 条，"
+            f"命中 {cache_stats['hits']} 次，未命中 {cache_stats['misses']} 次，命中率 {cache_stats['hit_ratio']:.1%}"
+        )
+    media_stats = media_cache.stats()
+    logger.info(
+        f"媒体缓存: 内存 {media_stats['memory_bytes']}/{media_stats['memory_max_bytes']} 字节，"
+        f"磁盘 {media_stats['disk_bytes']}/{media_stats['disk_max_bytes']} 字节，"
+        f"内存命中 {media_stats['memory_hits']} 次，磁盘命中 {media_stats['disk_hits']} 次，"
+        f"未命中 {media_stats['misses']} 次，命中率 {media_stats['hit_ratio']:.1%}"
+    )
+    if rpc_stats := rpc_metrics.snapshot():
+        logger.info(
+            "Napcat请求统计: "
+            + "; ".join(
+                f"{action} {stats['requests']}次 p50 {format_ms(stats['p50_ms'])} p99 {format_ms(stats['p99_ms'])} "
+                f"超时 {stats['timeout']} 断线 {stats['disconnected']} 失败 {stats['failed'] + stats['error']}"
+                for action, stats in rpc_stats.items()
+            )
+        )
+
+
+async def log_stats_periodically() -> None:
+    """每个心跳间隔输出一次统计，不依赖诊断接口是否开启"""
+    while True:
+        await asyncio.sleep(global_config.napcat_server.heartbeat_interval)
+        log_stats()
+
+
+class DiagnosticsServer:
+    """
+    诊断HTTP接口
+
+    GET /metrics      Prometheus文本格式
+    GET /diagnostics  JSON格式
+    """
+
+    def __init__(self, adapter):
+        self.adapter = adapter
+        self._runner: Optional[web.AppRunner] = None
+
+    async def _metrics(self, request: web.Request) -> web.Response:
+        return web.Response(
+            text=render_prometheus(collect_diagnostics(self.adapter)), content_type="text/plain", charset="utf-8"
+        )
+
+    async def _diagnostics(self, request: web.Request) -> web.Response:
+        return web.json_response(collect_diagnostics(self.adapter))
+
+    async def run(self) -> None:
+        """启动接口与事件循环延迟监测，直到被取消"""
+        app = web.Application()
+        app.router.add_get("/metrics", self._metrics)
+        app.router.add_get("/diagnostics", self._diagnostics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        host, port = global_config.diagnostics.host, global_config.diagnostics.port
+        await web.TCPSite(self._runner, host, port).start()
+        logger.info(f"诊断接口已启动: http://{host}:{port}/metrics")
+        try:
+            await loop_lag_monitor.run()
+        finally:
+            await self._runner.cleanup()
@@ -0,0 +1,346 @@
+import asyncio
+import itertools
+from collections import Counter, deque
+from enum import IntEnum
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from plugins.napcat_plugin.ada.config import global_config
+from plugins.napcat_plugin.ada.logger import logger
+from plugins.napcat_plugin.ada.recv_handler import MessageType, RealMessageType
+from plugins.napcat_plugin.ada.send_handler import send_handler
+from plugins.napcat_plugin.ada.tracing import Trace, current_trace
+
+
+class EventLane(IntEnum):
+    """事件优先级通道，数值越小越优先"""
+
+    CONTROL = 0  # 元事件（心跳、生命周期）
+    DIRECT = 1  # 私聊、@机器人、回复机器人的消息
+    NOTICE = 2  # 通知事件
+    AMBIENT = 3  # 普通群聊消息
+
+
+SHED_EXEMPT_LANES = (EventLane.CONTROL, EventLane.NOTICE)
+"""队列满时也不会被丢弃的通道"""
+
+MEDIA_SEGMENT_TYPES = {RealMessageType.image, RealMessageType.record, RealMessageType.video, RealMessageType.forward}
+
+
+def has_media(event: dict) -> bool:
+    """判断消息是否包含需要下载或额外请求的媒体内容"""
+    message = event.get("message")
+    return isinstance(message, list) and any(segment.get("type") in MEDIA_SEGMENT_TYPES for segment in message)
+
+
+def classify_event(event: dict) -> EventLane:
+    """
+    根据事件内容快速判断其优先级，不发起任何请求
+    """
+    post_type = event.get("post_type")
+    if post_type == "meta_event":
+        return EventLane.CONTROL
+    if post_type == "notice":
+        return EventLane.NOTICE
+    if event.get("message_type") == MessageType.private:
+        return EventLane.DIRECT
+    self_id = str(event.get("self_id"))
+    message = event.get("message")
+    if isinstance(message, list):
+        for segment in message:
+            segment_type = segment.get("type")
+            segment_data = segment.get("data") or {}
+            if segment_type == RealMessageType.at and str(segment_data.get("qq")) == self_id:
+                return EventLane.DIRECT
+            if segment_type == RealMessageType.reply and send_handler.is_sent_message(segment_data.get("id")):
+                return EventLane.DIRECT
+    return EventLane.AMBIENT
+
+
+QueuedEvent = Tuple[int, EventLane, dict, Optional[Trace]]
+"""(到达序号, 通道, 事件, 处理链路)"""
+
+
+class _Conversation:
+    """分片中单个会话积压的事件，按到达顺序排列"""
+
+    __slots__ = ("events", "lane_counts")
+
+    def __init__(self):
+        self.events: Deque[QueuedEvent] = deque()
+        self.lane_counts: List[int] = [0] * len(EventLane)
+
+    def priority(self) -> EventLane:
+        """会话中积压的优先级最高的事件所在的通道"""
+        return next(lane for lane in EventLane if self.lane_counts[lane])
+
+
+class PriorityLaneQueue:
+    """
+    按会话保序的多通道优先级队列
+
+    同一会话（群/私聊）的事件总是按到达顺序取出，@机器人的消息、通知不会越过同一会话中更早的消息。
+    优先级只用于决定先处理哪个会话：会话中积压的优先级最高的事件决定该会话的优先级，
+    优先级相同时先处理最早到达的会话。
+    为避免低优先级会话饿死，当连续 starvation_limit 次跳过队头更早到达的会话后，
+    会强制处理队头事件等待最久的会话。
+
+    maxsize大于0时队列有界，队列满时按overflow_policy处理：
+    - drop_oldest_ambient: 丢弃最早的普通群聊消息
+    - drop_media_first: 优先丢弃含媒体的普通群聊消息，没有则丢弃最早的普通群聊消息
+    - block: 等待队列腾出空间，最多等待block_timeout秒后丢弃新事件
+    除block外的策略都不会等待，以免阻塞读取方（同时阻塞了请求响应的接收）：
+    队列中没有普通群聊消息可丢弃时直接丢弃新事件，已排队的私聊、@机器人消息不会被挤掉。
+    元事件与通知不会被丢弃，也不受容量限制。被丢弃事件的处理链路以discard结束。
+    """
+
+    def __init__(
+        self,
+        starvation_limit: int,
+        maxsize: int = 0,
+        overflow_policy: str = "drop_oldest_ambient",
+        block_timeout: float = 5,
+    ):
+        self.starvation_limit = max(1, starvation_limit)
+        self.maxsize = maxsize
+        self.overflow_policy = overflow_policy
+        self.block_timeout = block_timeout
+        self.shed_counts: Counter[str] = Counter()
+        """按 "策略:原因" 统计的被丢弃事件数"""
+        self._not_full = asyncio.Event()
+        self._not_full.set()
+        self._conversations: Dict[int, _Conversation] = {}
+        """会话key -> 该会话积压的事件，没有积压的会话会被移除"""
+        self._lane_sizes: List[int] = [0] * len(EventLane)
+        self._size: int = 0
+        self._sequence = itertools.count()
+        self._not_empty = asyncio.Event()
+        self._bypassed: int = 0
+        """连续跳过队头更早到达的会话的次数"""
+        self._unfinished_tasks: int = 0
+        self._finished = asyncio.Event()
+        self._finished.set()
+
+    def put_nowait(self, event: dict, lane: EventLane, trace: Optional[Trace] = None, conversation: int = 0) -> None:
+        queued = self._conversations.get(conversation)
+        if queued is None:
+            queued = self._conversations[conversation] = _Conversation()
+        queued.events.append((next(self._sequence), lane, event, trace))
+        queued.lane_counts[lane] += 1
+        self._lane_sizes[lane] += 1
+        self._size += 1
+        self._unfinished_tasks += 1
+        self._finished.clear()
+        self._not_empty.set()
+
+    def full(self) -> bool:
+        return 0 < self.maxsize <= self.qsize()
+
+    async def put(self, event: dict, lane: EventLane, trace: Optional[Trace] = None, conversation: int = 0) -> bool:
+        """
+        放入事件，队列满时按溢出策略处理
+        Parameters:
+            trace: 事件的处理链路，随事件一起取出
+            conversation: 事件所属会话的key，同一会话的事件按到达顺序取出
+        Returns:
+            bool: 事件是否被放入队列
+        """
+        if lane in SHED_EXEMPT_LANES or not self.full():
+            self.put_nowait(event, lane, trace, conversation)
+            return True
+        if self.overflow_policy == "drop_media_first":
+            if self._drop_queued_ambient(has_media):
+                self._record_shed("queued_media")
+                self.put_nowait(event, lane, trace, conversation)
+                return True
+            if lane == EventLane.AMBIENT and has_media(event):
+                self._reject(trace, "incoming_media")
+                return False
+        if self.overflow_policy in ("drop_oldest_ambient", "drop_media_first"):
+            if self._drop_queued_ambient(lambda queued_event: True):
+                self._record_shed("oldest_ambient")
+                self.put_nowait(event, lane, trace, conversation)
+                return True
+            # 队列中只剩优先级更高的事件，不挤掉已排队的事件
+            self._reject(trace, "incoming_ambient" if lane == EventLane.AMBIENT else "incoming_direct")
+            return False
+        # 阻塞读取方，等待worker腾出空间；限时等待以免与等待响应的worker互相卡死
+        try:
+            while self.full():
+                self._not_full.clear()
+                await asyncio.wait_for(self._not_full.wait(), self.block_timeout)
+        except TimeoutError:
+            self._reject(trace, "block_timeout")
+            return False
+        self.put_nowait(event, lane, trace, conversation)
+        return True
+
+    def _drop_queued_ambient(self, predicate: Callable[[dict], bool]) -> bool:
+        """丢弃最早的满足条件的普通群聊消息"""
+        candidate: Optional[Tuple[int, _Conversation, QueuedEvent]] = None
+        for conversation, queued in self._conversations.items():
+            if not queued.lane_counts[EventLane.AMBIENT]:
+                continue
+            for item in queued.events:
+                if item[1] == EventLane.AMBIENT and predicate(item[2]):
+                    if candidate is None or item[0] < candidate[2][0]:
+                        candidate = (conversation, queued, item)
+                    break
+        if candidate is None:
+            return False
+        conversation, queued, item = candidate
+        queued.events.remove(item)
+        self._forget(conversation, queued, item[1])
+        self.task_done()
+        if item[3] is not None:
+            item[3].discard()
+        return True
+
+    def _forget(self, conversation: int, queued: _Conversation, lane: EventLane) -> None:
+        """更新事件移出队列后的计数"""
+        queued.lane_counts[lane] -= 1
+        self._lane_sizes[lane] -= 1
+        self._size -= 1
+        if not queued.events:
+            del self._conversations[conversation]
+
+    def _reject(self, trace: Optional[Trace], reason: str) -> None:
+        """丢弃新到达的事件"""
+        if trace is not None:
+            trace.discard()
+        self._record_shed(reason)
+
+    def _record_shed(self, reason: str) -> None:
+        self.shed_counts[f"{self.overflow_policy}:{reason}"] += 1
+        logger.warning(f"事件队列已满（{self.maxsize}），按策略 {self.overflow_policy} 丢弃事件，原因: {reason}")
+
+    def _pop(self) -> Tuple[dict, Optional[Trace]]:
+        highest: Optional[Tuple[Tuple[EventLane, int], int]] = None
+        oldest: Optional[Tuple[int, int]] = None
+        for conversation, queued in self._conversations.items():
+            head_sequence = queued.events[0][0]
+            rank = (queued.priority(), head_sequence)
+            if highest is None or rank < highest[0]:
+                highest = (rank, conversation)
+            if oldest is None or head_sequence < oldest[0]:
+                oldest = (head_sequence, conversation)
+        conversation = highest[1]
+        if conversation != oldest[1]:
+            self._bypassed += 1
+            if self._bypassed > self.starvation_limit:
+                self._bypassed = 0
+                conversation = oldest[1]
+        else:
+            self._bypassed = 0
+        queued = self._conversations[conversation]
+        _, lane, event, trace = queued.events.popleft()
+        self._forget(conversation, queued, lane)
+        return event, trace
+
+    async def get(self) -> Tuple[dict, Optional[Trace]]:
+        """取出事件及其处理链路"""
+        while not self.qsize():
+            self._not_empty.clear()
+            await self._not_empty.wait()
+        item = self._pop()
+        if not self.full():
+            self._not_full.set()
+        return item
+
+    def task_done(self) -> None:
+        self._unfinished_tasks -= 1
+        if self._unfinished_tasks <= 0:
+            self._unfinished_tasks = 0
+            self._finished.set()
+
+    async def join(self) -> None:
+        await self._finished.wait()
+
+    def qsize(self) -> int:
+        return self._size
+
+    def lane_sizes(self) -> Dict[str, int]:
+        return {lane.name.lower(): self._lane_sizes[lane] for lane in EventLane}
+
+
+class EventDispatcher:
+    """
+    按会话分片的事件分发器
+
+    同一个群/私聊的事件总是进入同一个分片，由同一个worker处理，
+    不同会话的事件则在多个worker之间并行处理。
+    同一会话内始终按到达顺序处理，优先级通道只决定分片内先处理哪个会话。
+    """
+
+    def __init__(self, worker_count: int):
+        self.worker_count = max(1, worker_count)
+        self.shards: List[PriorityLaneQueue] = [
+            PriorityLaneQueue(
+                global_config.dispatch.starvation_limit,
+                maxsize=global_config.dispatch.shard_queue_size,
+                overflow_policy=global_config.dispatch.overflow_policy,
+                block_timeout=global_config.dispatch.block_timeout,
+            )
+            for _ in range(self.worker_count)
+        ]
+
+    @staticmethod
+    def conversation_key(event: dict) -> int:
+        """
+        获取事件所属会话的key，群事件使用群号，私聊事件使用用户ID，其余事件为0
+        """
+        if group_id := event.get("group_id"):
+            return int(group_id)
+        if user_id := event.get("user_id"):
+            return int(user_id)
+        return 0
+
+    def shard_index(self, event: dict) -> int:
+        return self.conversation_key(event) % self.worker_count
+
+    async def put(self, event: dict, trace: Optional[Trace] = None) -> bool:
+        """将事件放入其会话对应的分片，返回事件是否被接收"""
+        conversation = self.conversation_key(event)
+        shard = self.shards[conversation % self.worker_count]
+        return await shard.put(event, classify_event(event), trace, conversation)
+
+    async def run(self, handler: Callable[[dict], Awaitable[None]]) -> None:
+        """启动所有worker，直到被取消"""
+        await asyncio.gather(*(self._worker(index, handler) for index in range(self.worker_count)))
+
+    async def _worker(self, index: int, handler: Callable[[dict], Awaitable[None]]) -> None:
+        queue = self.shards[index]
+        while True:
+            event, trace = await queue.get()
+            if trace is not None:
+                trace.mark("queue_wait")
+            token = current_trace.set(trace)
+            try:
+                await handler(event)
+            except Exception as e:
+                # 单个事件处理失败不应导致整个分片停止
+                logger.exception(f"分片 {index} 处理事件失败: {e}")
+            finally:
+                current_trace.reset(token)
+                queue.task_done()
+                if trace is not None:
+                    trace.mark("handle")
+                    trace.finish()
+
+    def queue_depths(self) -> Dict[int, int]:
+        """获取每个分片当前积压的事件数"""
+        return {index: queue.qsize() for index, queue in enumerate(self.shards)}
+
+    def shed_counts(self) -> Dict[str, int]:
+        """获取按 "策略:原因" 统计的丢弃事件数"""
+        total: Counter[str] = Counter()
+        for queue in self.shards:
+            total.update(queue.shed_counts)
+        return dict(total)
+
+    def lane_depths(self) -> Dict[str, int]:
+        """获取每个优先级通道当前积压的事件总数"""
+        depths = {lane.name.lower(): 0 for lane in EventLane}
+        for queue in self.shards:
+            for lane, size in queue.lane_sizes().items():
+                depths[lane] += size
+        return depths
@@ -0,0 +1,65 @@
+import json
+import re
+from dataclasses import dataclass
+from typing import Any, Optional
+
+try:
+    import orjson  # 可选依赖，安装后用于加速解码
+except ImportError:
+    orjson = None
+
+_ECHO_PATTERN = re.compile(r'"echo"\s*:\s*"([^"\\]*)"')
+_POST_TYPE_PATTERN = re.compile(r'"post_type"\s*:\s*"(\w+)"')
+_MESSAGE_TYPE_PATTERN = re.compile(r'"message_type"\s*:\s*"(\w+)"')
+_GROUP_ID_PATTERN = re.compile(r'"group_id"\s*:\s*(\d+)')
+
+ECHO_TAIL_WINDOW = 512
+"""Napcat把echo放在响应帧末尾，先只在最后这么多字符中查找，避免大响应被完整扫描两遍"""
+
+
+def json_loads(raw: str | bytes) -> Any:
+    """解码JSON，安装了orjson时使用orjson"""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+@dataclass
+class FramePeek:
+    """不完整解码帧即可得到的路由信息"""
+
+    echo: Optional[str] = None
+    """响应帧的echo，存在即说明是请求的响应"""
+    post_type: Optional[str] = None
+    message_type: Optional[str] = None
+    group_id: Optional[int] = None
+
+
+def peek_frame(raw: str | bytes) -> FramePeek:
+    """
+    在不完整解码的情况下读取帧的路由字段
+
+    JSON字符串内部的引号都会被转义，因此这些模式只会匹配真正的键。
+    事件帧没有echo字段，而响应帧的data中可能嵌套完整的消息事件（如get_msg），所以先判断echo。
+    echo先在帧末尾查找，找不到时才扫描整个帧，因此只有事件帧（通常较小）需要完整扫描。
+    消息事件的转发内容中可能嵌套其他消息，message_type与group_id只有在所有匹配都一致时才采用，
+    否则保持为None，交由完整解码处理。
+    二进制帧不做预读，返回空的FramePeek，同样交由完整解码处理。
+    """
+    if not isinstance(raw, str):
+        return FramePeek()
+    echo_match = _ECHO_PATTERN.search(raw, max(0, len(raw) - ECHO_TAIL_WINDOW)) or _ECHO_PATTERN.search(raw)
+    if echo_match:
+        return FramePeek(echo=echo_match[1])
+    peek = FramePeek()
+    if post_type_match := _POST_TYPE_PATTERN.search(raw):
+        peek.post_type = post_type_match[1]
+    if peek.post_type == "message":
+        message_types = set(_MESSAGE_TYPE_PATTERN.findall(raw))
+        if len(message_types) == 1:
+            peek.message_type = message_types.pop()
+        if peek.message_type == "group":
+            group_ids = set(_GROUP_ID_PATTERN.findall(raw))
+            if len(group_ids) == 1:
+                peek.group_id = int(group_ids.pop())
+    return peek
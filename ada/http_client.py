@@ -0,0 +1,77 @@
+import ssl
+import aiohttp
+from typing import Optional
+
+from plugins.napcat_plugin.ada.config import global_config
+from plugins.napcat_plugin.ada.logger import logger
+
+
+def _create_ssl_context() -> ssl.SSLContext:
+    # QQ的多媒体服务器仍需要较低的安全等级
+    context = ssl.create_default_context()
+    context.set_ciphers("DEFAULT@SECLEVEL=1")
+    context.minimum_version = ssl.TLSVersion.TLSv1_2
+    return context
+
+
+class MediaDownloader:
+    """
+    共享的异步HTTP下载器
+
+    所有图片、表情包、转发消息中的媒体下载共用同一个连接池，
+    复用keep-alive连接与TLS会话，按主机的并发限制由连接池的limit_per_host负责。
+    """
+
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self):
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # 会话必须在事件循环内创建，因此延迟到第一次下载时
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                ssl=_create_ssl_context(),
+                limit=global_config.media.connection_limit,
+                limit_per_host=global_config.media.per_host_limit,
+                ttl_dns_cache=300,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=global_config.media.download_timeout),
+            )
+        return self._session
+
+    async def download(self, url: str, max_bytes: Optional[int] = None) -> bytes:
+        # sourcery skip: raise-specific-error
+        """
+        下载资源，超过大小上限时中止
+        Parameters:
+            url: str: 资源地址
+            max_bytes: int: 最大字节数，默认使用配置中的上限
+        Returns:
+            bytes: 资源内容
+        """
+        if max_bytes is None:
+            max_bytes = global_config.media.max_download_bytes
+        async with self._get_session().get(url) as response:
+            if response.status != 200:
+                raise Exception(f"HTTP Error: {response.status}")
+            if response.content_length and response.content_length > max_bytes:
+                raise Exception(f"资源过大: {response.content_length} 字节，上限 {max_bytes} 字节")
+            buffer = bytearray()
+            async for chunk in response.content.iter_chunked(self.CHUNK_SIZE):
+                buffer.extend(chunk)
+                if len(buffer) > max_bytes:
+                    raise Exception(f"资源过大: 超过上限 {max_bytes} 字节")
+            return bytes(buffer)
+
+    async def close(self) -> None:
+        """关闭连接池"""
+        if self._session and not self._session.closed:
+            await self._session.close()
+            logger.debug("媒体下载连接池已关闭")
+        self._session = None
+
+
+media_downloader = MediaDownloader()
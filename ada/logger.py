@@ -1,21 +1,75 @@
+from collections import Counter
+from typing import Any, Callable
+
 from loguru import logger
 from plugins.napcat_plugin.ada.config import global_config
 import sys
 
 # 默认 logger
+# enqueue=True 时日志经队列交由后台线程写入stderr，终端输出缓慢时也不会阻塞事件循环
 logger.remove()
 logger.add(
     sys.stderr,
     level=global_config.debug.level,
     format="<blue>{time:YYYY-MM-DD HH:mm:ss}</blue> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>",
     filter=lambda record: "name" not in record["extra"] or record["extra"].get("name") != "maim_message",
+    enqueue=True,
 )
 logger.add(
     sys.stderr,
     level="INFO",
     format="<red>{time:YYYY-MM-DD HH:mm:ss}</red> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>",
     filter=lambda record: record["extra"].get("name") == "maim_message",
+    enqueue=True,
 )
 # 创建样式不同的 logger
 custom_logger = logger.bind(name="maim_message")
 logger = logger.bind(name="MaiBot-Napcat-Adapter")
+
+DEBUG_ENABLED: bool = logger.level(global_config.debug.level).no <= logger.level("DEBUG").no
+"""DEBUG级别日志是否会被输出，热路径上用于跳过日志相关的计算"""
+
+DEBUG_TEXT_LIMIT = 1500
+"""调试日志中单条内容的最大长度"""
+
+
+def truncate(content: Any, limit: int = DEBUG_TEXT_LIMIT) -> str:
+    """将内容转为字符串并截断到指定长度"""
+    text = str(content)
+    return f"{text[:limit]}..." if len(text) > limit else text
+
+
+def lazy_debug(message: str, *args: Callable[[], Any]) -> None:
+    """
+    延迟格式化的DEBUG日志
+
+    参数为无参函数，只有DEBUG级别启用时才会被调用并填入message中的 {} 占位符
+    """
+    if DEBUG_ENABLED:
+        logger.opt(lazy=True, depth=1).debug(message, *args)
+
+
+class SampledLogger:
+    """
+    采样输出的DEBUG日志，用于每帧都会触发的高频日志
+
+    同一个key下每 every 条只输出1条，参数同 lazy_debug
+    """
+
+    def __init__(self, every: int):
+        self.every = max(1, every)
+        self._counts: Counter[str] = Counter()
+
+    def debug(self, key: str, message: str, *args: Callable[[], Any]) -> None:
+        if not DEBUG_ENABLED:
+            return
+        count = self._counts[key]
+        self._counts[key] = count + 1
+        if count % self.every:
+            return
+        if count:
+            message = f"{message}（采样输出，已累计 {count + 1} 条）"
+        logger.opt(lazy=True, depth=1).debug(message, *args)
+
+
+sampled_logger = SampledLogger(global_config.debug.sample_every)
@@ -0,0 +1,242 @@
+import asyncio
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set
+
+from plugins.napcat_plugin.ada.config import global_config
+from plugins.napcat_plugin.ada.logger import logger
+
+MEDIA_CACHE_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "media_cache")
+
+
+class MediaCache:
+    """
+    内容寻址的媒体缓存
+
+    外部key（QQ文件ID或URL）先映射到内容哈希，再由内容哈希找到Base64数据，
+    相同内容的不同key只保存一份。
+    分为两层：按字节数限制大小的内存LRU，以及data目录下的磁盘缓存。
+    """
+
+    KEY_INDEX_MAX_SIZE = 16384
+    """key索引本身很小，按条目数限制即可"""
+
+    def __init__(self, memory_max_bytes: int, disk_max_bytes: int, disk_dir: str = MEDIA_CACHE_DIR):
+        self.memory_max_bytes = memory_max_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self.objects_dir = os.path.join(disk_dir, "objects")
+        self.keys_dir = os.path.join(disk_dir, "keys")
+
+        self._key_index: OrderedDict[str, str] = OrderedDict()
+        """key -> 内容哈希"""
+        self._memory: OrderedDict[str, str] = OrderedDict()
+        """内容哈希 -> Base64数据"""
+        self._memory_bytes: int = 0
+        self._disk_index: Optional[OrderedDict[str, int]] = None
+        """内容哈希 -> 文件大小，按最近使用时间排序，首次访问磁盘时加载"""
+        self._disk_bytes: int = 0
+        self._key_files: Dict[str, str] = {}
+        """磁盘上的key文件名 -> 内容哈希"""
+        self._digest_key_files: Dict[str, Set[str]] = {}
+        """内容哈希 -> 指向它的key文件名，淘汰内容时一并删除这些key文件"""
+        self._disk_lock = threading.Lock()
+        """磁盘操作在线程池中执行，需要加锁保护磁盘索引"""
+
+        self.memory_hits: int = 0
+        self.disk_hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    @staticmethod
+    def content_hash(data: str) -> str:
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _key_file_name(key: str) -> str:
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    @property
+    def disk_enabled(self) -> bool:
+        return self.disk_max_bytes > 0
+
+    # ---------------- 内存层 ----------------
+
+    def get_memory(self, key: str) -> Optional[str]:
+        """只查询内存层，不会访问磁盘，可在同步代码中使用"""
+        digest = self._key_index.get(key)
+        if digest is None or digest not in self._memory:
+            return None
+        self._key_index.move_to_end(key)
+        self._memory.move_to_end(digest)
+        self.memory_hits += 1
+        return self._memory[digest]
+
+    def put_memory(self, key: str, data: str, digest: Optional[str] = None) -> str:
+        """写入内存层，返回内容哈希"""
+        digest = digest or self.content_hash(data)
+        self._key_index[key] = digest
+        self._key_index.move_to_end(key)
+        if digest not in self._memory:
+            self._memory[digest] = data
+            self._memory_bytes += len(data)
+        self._memory.move_to_end(digest)
+        while self._memory_bytes > self.memory_max_bytes and self._memory:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self.evictions += 1
+        while len(self._key_index) > self.KEY_INDEX_MAX_SIZE:
+            self._key_index.popitem(last=False)
+        return digest
+
+    # ---------------- 磁盘层 ----------------
+
+    def _load_disk_index(self) -> None:
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.keys_dir, exist_ok=True)
+        entries = []
+        for entry in os.scandir(self.objects_dir):
+            if entry.is_file():
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name, stat.st_size))
+        entries.sort()
+        self._disk_index = OrderedDict((name, size) for _, name, size in entries)
+        self._disk_bytes = sum(size for _, _, size in entries)
+        for entry in os.scandir(self.keys_dir):
+            if not entry.is_file():
+                continue
+            with open(entry.path, "r", encoding="utf-8") as f:
+                digest = f.read().strip()
+            if digest in self._disk_index:
+                self._link_key_file(entry.name, digest)
+            else:
+                os.remove(entry.path)  # 内容已被淘汰的遗留key文件
+        logger.debug(f"媒体磁盘缓存已加载，共 {len(self._disk_index)} 个文件，{self._disk_bytes} 字节")
+
+    def _link_key_file(self, name: str, digest: str) -> None:
+        previous = self._key_files.get(name)
+        if previous is not None and previous != digest:
+            self._digest_key_files.get(previous, set()).discard(name)
+        self._key_files[name] = digest
+        self._digest_key_files.setdefault(digest, set()).add(name)
+
+    def _remove_object(self, digest: str) -> None:
+        """从磁盘索引中移除内容，并删除内容文件与指向它的key文件"""
+        self._disk_bytes -= self._disk_index.pop(digest, 0)
+        for name in self._digest_key_files.pop(digest, ()):
+            self._key_files.pop(name, None)
+            try:
+                os.remove(os.path.join(self.keys_dir, name))
+            except FileNotFoundError:
+                pass
+        try:
+            os.remove(os.path.join(self.objects_dir, digest))
+        except FileNotFoundError:
+            pass
+
+    def _disk_get(self, key: str) -> Optional[tuple[str, str]]:
+        with self._disk_lock:
+            return self._disk_get_locked(key)
+
+    def _disk_put(self, key: str, data: str, digest: str) -> None:
+        with self._disk_lock:
+            self._disk_put_locked(key, data, digest)
+
+    def _disk_get_locked(self, key: str) -> Optional[tuple[str, str]]:
+        if self._disk_index is None:
+            self._load_disk_index()
+        key_path = os.path.join(self.keys_dir, self._key_file_name(key))
+        try:
+            with open(key_path, "r", encoding="utf-8") as f:
+                digest = f.read().strip()
+        except FileNotFoundError:
+            return None
+        if digest not in self._disk_index:
+            os.remove(key_path)  # 内容已被淘汰
+            self._key_files.pop(self._key_file_name(key), None)
+            return None
+        object_path = os.path.join(self.objects_dir, digest)
+        try:
+            with open(object_path, "r", encoding="utf-8") as f:
+                data = f.read()
+        except FileNotFoundError:
+            self._remove_object(digest)
+            return None
+        os.utime(object_path)
+        self._disk_index.move_to_end(digest)
+        return digest, data
+
+    def _disk_put_locked(self, key: str, data: str, digest: str) -> None:
+        if self._disk_index is None:
+            self._load_disk_index()
+        if digest not in self._disk_index:
+            object_path = os.path.join(self.objects_dir, digest)
+            temp_path = f"{object_path}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(temp_path, object_path)
+            self._disk_index[digest] = len(data)
+            self._disk_bytes += len(data)
+        else:
+            self._disk_index.move_to_end(digest)
+        key_file_name = self._key_file_name(key)
+        with open(os.path.join(self.keys_dir, key_file_name), "w", encoding="utf-8") as f:
+            f.write(digest)
+        self._link_key_file(key_file_name, digest)
+        while self._disk_bytes > self.disk_max_bytes and self._disk_index:
+            self._remove_object(next(iter(self._disk_index)))
+            self.evictions += 1
+
+    # ---------------- 对外接口 ----------------
+
+    async def get(self, key: str) -> Optional[str]:
+        """依次查询内存层与磁盘层，磁盘命中后回填内存层"""
+        if (data := self.get_memory(key)) is not None:
+            return data
+        if self.disk_enabled:
+            try:
+                disk_result = await asyncio.to_thread(self._disk_get, key)
+            except Exception as e:
+                logger.warning(f"读取媒体磁盘缓存失败: {e}")
+                disk_result = None
+            if disk_result is not None:
+                digest, data = disk_result
+                self.disk_hits += 1
+                self.put_memory(key, data, digest)
+                return data
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, data: str) -> None:
+        """写入内存层与磁盘层"""
+        digest = self.put_memory(key, data)
+        if self.disk_enabled:
+            try:
+                await asyncio.to_thread(self._disk_put, key, data, digest)
+            except Exception as e:
+                logger.warning(f"写入媒体磁盘缓存失败: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        total = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "name": "media",
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "memory_max_bytes": self.memory_max_bytes,
+            "disk_entries": len(self._disk_index) if self._disk_index is not None else None,
+            "disk_bytes": self._disk_bytes,
+            "disk_max_bytes": self.disk_max_bytes,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": (self.memory_hits + self.disk_hits) / total if total else 0.0,
+        }
+
+
+media_cache = MediaCache(
+    memory_max_bytes=global_config.media.memory_cache_bytes,
+    disk_max_bytes=global_config.media.disk_cache_bytes,
+)
@@ -1,5 +1,7 @@
-from plugins.napcat_plugin.ada.logger import logger
+from plugins.napcat_plugin.ada.logger import logger, lazy_debug, truncate
 from plugins.napcat_plugin.ada.config import global_config
+from plugins.napcat_plugin.ada.cache import member_info_cache
+from plugins.napcat_plugin.ada.database import db_manager
 from plugins.napcat_plugin.ada.utils import (
     get_group_info,
     get_member_info,
@@ -7,16 +9,18 @@ from plugins.napcat_plugin.ada.utils import (
     get_record_detail,
     get_self_info,
     get_message_detail,
+    napcat_request,
 )
 from plugins.napcat_plugin.ada.recv_handler.qq_emoji_list import qq_face
 from plugins.napcat_plugin.ada.recv_handler.message_sending import message_send_instance
 from plugins.napcat_plugin.ada.recv_handler import RealMessageType, MessageType, ACCEPT_FORMAT
+from plugins.napcat_plugin.ada.tracing import trace_span, traced
 
 import time
 import json
+import asyncio
 import websockets as Server
-from typing import List, Tuple, Optional, Dict, Any
-import uuid
+from typing import List, Tuple, Optional, Dict, Any, Set
 
 from maim_message import (
     UserInfo,
@@ -29,18 +33,41 @@ from maim_message import (
 )
 
 
-from plugins.napcat_plugin.ada.response_pool import get_response
-
-
 class MessageHandler:
     def __init__(self):
         self.server_connection: Server.ServerConnection = None
         self.bot_id_list: Dict[int, bool] = {}
+        """user_id -> 是否为QQ官方机器人，持久化在数据库中"""
+        self.bot_check_time: Dict[int, int] = {}
+        """user_id -> 最近一次机器人判定的时间"""
+        self._bot_rechecking: Set[int] = set()
+        for user_id, (is_bot, checked_time) in db_manager.get_bot_verdicts().items():
+            self.bot_id_list[user_id] = is_bot
+            self.bot_check_time[user_id] = checked_time
+
+        # 预先编译名单，使成员判断为O(1)
+        self.group_list: frozenset[int] = frozenset(global_config.chat.group_list)
+        self.private_list: frozenset[int] = frozenset(global_config.chat.private_list)
+        self.ban_user_id: frozenset[int] = frozenset(global_config.chat.ban_user_id)
 
     async def set_server_connection(self, server_connection: Server.ServerConnection) -> None:
         """设置Napcat连接"""
         self.server_connection = server_connection
 
+    def _check_member_cache(self, group_id: int, sender_info: dict) -> None:
+        """
+        消息自带发送者的昵称与群名片，若与缓存不一致说明已变更，使缓存失效
+        """
+        cache_key = (group_id, sender_info.get("user_id"))
+        cached_member_info = member_info_cache.peek(cache_key)
+        if cached_member_info is None:
+            return
+        if cached_member_info.get("nickname") != sender_info.get("nickname") or (
+            cached_member_info.get("card") or ""
+        ) != (sender_info.get("card") or ""):
+            member_info_cache.invalidate(cache_key)
+
+    @traced("chat_filter")
     async def check_allow_to_chat(
         self,
         user_id: int,
@@ -62,40 +89,91 @@ class MessageHandler:
         logger.debug(f"群聊id: {group_id}, 用户id: {user_id}")
         logger.debug("开始检查聊天白名单/黑名单")
         if group_id:
-            if global_config.chat.group_list_type == "whitelist" and group_id not in global_config.chat.group_list:
-                logger.warning("群聊不在聊天白名单中，消息被丢弃")
-                return False
-            elif global_config.chat.group_list_type == "blacklist" and group_id in global_config.chat.group_list:
-                logger.warning("群聊在聊天黑名单中，消息被丢弃")
+            if not self.is_group_allowed(group_id):
+                if global_config.chat.group_list_type == "whitelist":
+                    logger.warning("群聊不在聊天白名单中，消息被丢弃")
+                else:
+                    logger.warning("群聊在聊天黑名单中，消息被丢弃")
                 return False
         else:
-            if global_config.chat.private_list_type == "whitelist" and user_id not in global_config.chat.private_list:
+            if global_config.chat.private_list_type == "whitelist" and user_id not in self.private_list:
                 logger.warning("私聊不在聊天白名单中，消息被丢弃")
                 return False
-            elif global_config.chat.private_list_type == "blacklist" and user_id in global_config.chat.private_list:
+            elif global_config.chat.private_list_type == "blacklist" and user_id in self.private_list:
                 logger.warning("私聊在聊天黑名单中，消息被丢弃")
                 return False
-        if user_id in global_config.chat.ban_user_id and not ignore_global_list:
+        if user_id in self.ban_user_id and not ignore_global_list:
             logger.warning("用户在全局黑名单中，消息被丢弃")
             return False
 
         if global_config.chat.ban_qq_bot and group_id and not ignore_bot:
-            logger.debug("开始判断是否为机器人")
-            member_info = await get_member_info(self.server_connection, group_id, user_id)
-            if member_info:
-                is_bot = member_info.get("is_robot")
-                if is_bot is None:
-                    logger.warning("无法获取用户是否为机器人，默认为不是但是不进行更新")
-                else:
-                    if is_bot:
-                        logger.warning("QQ官方机器人消息拦截已启用，消息被丢弃，新机器人加入拦截名单")
-                        self.bot_id_list[user_id] = True
-                        return False
-                    else:
-                        self.bot_id_list[user_id] = False
+            if user_id in self.bot_id_list:
+                # 已有判定结果，过期则在后台复查，不阻塞当前消息
+                if time.time() - self.bot_check_time.get(user_id, 0) > global_config.cache.bot_verdict_ttl:
+                    self._schedule_bot_recheck(group_id, user_id)
+                is_bot = self.bot_id_list[user_id]
+            else:
+                is_bot = await self.check_is_bot(group_id, user_id)
+            if is_bot:
+                logger.warning("QQ官方机器人消息拦截已启用，消息被丢弃")
+                return False
 
         return True
 
+    def is_group_allowed(self, group_id: int) -> bool:
+        """
+        仅根据群聊黑白名单判断是否允许聊天，不发起任何请求
+        """
+        if global_config.chat.group_list_type == "whitelist":
+            return group_id in self.group_list
+        return group_id not in self.group_list
+
+    async def check_is_bot(self, group_id: int, user_id: int, no_cache: bool = False) -> bool:
+        """
+        向Napcat查询用户是否为QQ官方机器人，并记录判定结果
+        Parameters:
+            group_id: int: 群ID
+            user_id: int: 用户ID
+            no_cache: bool: 是否跳过成员信息缓存
+        Returns:
+            bool: 是否为机器人，无法判定时返回False
+        """
+        logger.debug("开始判断是否为机器人")
+        member_info = await get_member_info(self.server_connection, group_id, user_id, no_cache=no_cache)
+        if not member_info:
+            return False
+        is_bot = member_info.get("is_robot")
+        if is_bot is None:
+            logger.warning("无法获取用户是否为机器人，默认为不是但是不进行更新")
+            return False
+        if is_bot and not self.bot_id_list.get(user_id):
+            logger.warning("检测到新的QQ官方机器人，加入拦截名单")
+        checked_time = int(time.time())
+        self.bot_id_list[user_id] = bool(is_bot)
+        self.bot_check_time[user_id] = checked_time
+        try:
+            # 数据库写入在线程中进行，避免新用户集中出现时阻塞事件循环
+            await asyncio.to_thread(db_manager.set_bot_verdict, user_id, bool(is_bot), checked_time)
+        except Exception as e:
+            logger.error(f"保存机器人判定失败: {e}")
+        return bool(is_bot)
+
+    def _schedule_bot_recheck(self, group_id: int, user_id: int) -> None:
+        """在后台复查过期的机器人判定"""
+        if user_id in self._bot_rechecking:
+            return
+        self._bot_rechecking.add(user_id)
+
+        async def recheck() -> None:
+            try:
+                await self.check_is_bot(group_id, user_id, no_cache=True)
+            except Exception as e:
+                logger.error(f"复查机器人判定失败: {e}")
+            finally:
+                self._bot_rechecking.discard(user_id)
+
+        asyncio.create_task(recheck())
+
     async def handle_raw_message(self, raw_message: dict) -> None:
         # sourcery skip: low-code-quality, remove-unreachable-code
         """
@@ -177,6 +255,7 @@ class MessageHandler:
             sub_type = raw_message.get("sub_type")
             if sub_type == MessageType.Group.normal:
                 sender_info: dict = raw_message.get("sender")
+                self._check_member_cache(raw_message.get("group_id"), sender_info)
 
                 if not await self.check_allow_to_chat(sender_info.get("user_id"), raw_message.get("group_id")):
                     return None
@@ -227,7 +306,8 @@ class MessageHandler:
             return None
 
         # 获取Seg列表
-        seg_message: List[Seg] = await self.handle_real_message(raw_message)
+        with trace_span("build_seg"):
+            seg_message: List[Seg] = await self.handle_real_message(raw_message)
         if not seg_message:
             logger.warning("处理后消息内容为空")
             return None
@@ -372,7 +452,7 @@ class MessageHandler:
         message_data: dict = raw_message.get("data")
         image_sub_type = message_data.get("sub_type")
         try:
-            image_base64 = await get_image_base64(message_data.get("url"))
+            image_base64 = await get_image_base64(message_data.get("url"), message_data.get("file"))
         except Exception as e:
             logger.error(f"图片消息处理失败: {str(e)}")
             return None
@@ -500,31 +580,13 @@ class MessageHandler:
     async def _recursive_parse_image_seg(self, seg_data: Seg, to_image: bool) -> Seg:
         # sourcery skip: merge-else-if-into-elif
         if to_image:
-            if seg_data.type == "seglist":
-                new_seg_list = []
-                for i_seg in seg_data.data:
-                    parsed_seg = await self._recursive_parse_image_seg(i_seg, to_image)
-                    new_seg_list.append(parsed_seg)
-                return Seg(type="seglist", data=new_seg_list)
-            elif seg_data.type == "image":
-                image_url = seg_data.data
-                try:
-                    encoded_image = await get_image_base64(image_url)
-                except Exception as e:
-                    logger.error(f"图片处理失败: {str(e)}")
-                    return Seg(type="text", data="[图片]")
-                return Seg(type="image", data=encoded_image)
-            elif seg_data.type == "emoji":
-                image_url = seg_data.data
-                try:
-                    encoded_image = await get_image_base64(image_url)
-                except Exception as e:
-                    logger.error(f"图片处理失败: {str(e)}")
-                    return Seg(type="text", data="[表情包]")
-                return Seg(type="emoji", data=encoded_image)
-            else:
-                logger.trace(f"不处理类型: {seg_data.type}")
-                return seg_data
+            # 先收集所有图片，并发下载后再按原顺序替换回去
+            media_segs: List[Seg] = []
+            self._collect_media_seg(seg_data, media_segs)
+            semaphore = asyncio.Semaphore(global_config.media.forward_download_concurrency)
+            fetched_segs = await asyncio.gather(*(self._fetch_media_seg(seg, semaphore) for seg in media_segs))
+            replacements = {id(seg): fetched for seg, fetched in zip(media_segs, fetched_segs, strict=True)}
+            return self._replace_media_seg(seg_data, replacements)
         else:
             if seg_data.type == "seglist":
                 new_seg_list = []
@@ -540,6 +602,34 @@ class MessageHandler:
                 logger.trace(f"不处理类型: {seg_data.type}")
                 return seg_data
 
+    def _collect_media_seg(self, seg_data: Seg, media_segs: List[Seg]) -> None:
+        """按出现顺序收集转发消息中待下载的图片与表情包"""
+        if seg_data.type == "seglist":
+            for i_seg in seg_data.data:
+                self._collect_media_seg(i_seg, media_segs)
+        elif seg_data.type in ("image", "emoji"):
+            media_segs.append(seg_data)
+
+    async def _fetch_media_seg(self, seg_data: Seg, semaphore: asyncio.Semaphore) -> Seg:
+        """下载单个图片或表情包，失败时返回占位文本"""
+        async with semaphore:
+            try:
+                encoded_image = await get_image_base64(seg_data.data)
+            except Exception as e:
+                logger.error(f"图片处理失败: {str(e)}")
+                return Seg(type="text", data="[图片]" if seg_data.type == "image" else "[表情包]")
+        return Seg(type=seg_data.type, data=encoded_image)
+
+    def _replace_media_seg(self, seg_data: Seg, replacements: Dict[int, Seg]) -> Seg:
+        """将下载结果替换回原来的位置"""
+        if seg_data.type == "seglist":
+            return Seg(type="seglist", data=[self._replace_media_seg(i_seg, replacements) for i_seg in seg_data.data])
+        elif seg_data.type in ("image", "emoji"):
+            return replacements[id(seg_data)]
+        else:
+            logger.trace(f"不处理类型: {seg_data.type}")
+            return seg_data
+
     async def _handle_forward_message(self, message_list: list, layer: int) -> Tuple[Seg, int] | Tuple[None, int]:
         # sourcery skip: low-code-quality
         """
@@ -631,34 +721,24 @@ class MessageHandler:
                 seg_list.append(full_seg_data)
         return Seg(type="seglist", data=seg_list), image_count
 
+    @traced("message_lookup")
     async def _get_forward_message(self, raw_message: dict) -> Dict[str, Any] | None:
         forward_message_data: Dict = raw_message.get("data")
         if not forward_message_data:
             logger.warning("转发消息内容为空")
             return None
         forward_message_id = forward_message_data.get("id")
-        request_uuid = str(uuid.uuid4())
-        payload = json.dumps(
-            {
-                "action": "get_forward_msg",
-                "params": {"message_id": forward_message_id},
-                "echo": request_uuid,
-            }
-        )
         try:
-            await self.server_connection.send(payload)
-            response: dict = await get_response(request_uuid)
+            response: dict = await napcat_request(
+                self.server_connection, "get_forward_msg", {"message_id": forward_message_id}
+            )
         except TimeoutError:
             logger.error("获取转发消息超时")
             return None
         except Exception as e:
             logger.error(f"获取转发消息失败: {str(e)}")
             return None
-        logger.debug(
-            f"转发消息原始格式：{json.dumps(response)[:80]}..."
-            if len(json.dumps(response)) > 80
-            else json.dumps(response)
-        )
+        lazy_debug("转发消息原始格式：{}", lambda: truncate(json.dumps(response), 80))
         response_data: Dict = response.get("data")
         if not response_data:
             logger.warning("转发消息内容为空或获取失败")
@@ -1,4 +1,5 @@
 from plugins.napcat_plugin.ada.logger import logger
+from plugins.napcat_plugin.ada.tracing import traced
 from maim_message import MessageBase, Router
 
 
@@ -12,6 +13,7 @@ class MessageSending:
     def __init__(self):
         pass
 
+    @traced("maibot_send")
     async def message_send(self, message_base: MessageBase) -> bool:
         """
         发送消息
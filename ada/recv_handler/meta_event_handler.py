@@ -1,7 +1,10 @@
 from plugins.napcat_plugin.ada.logger import logger
 from plugins.napcat_plugin.ada.config.config import global_config
+from plugins.napcat_plugin.ada.utils import get_self_info
+from plugins.napcat_plugin.ada.connection_supervisor import connection_supervisor
 import time
 import asyncio
+import websockets as Server
 
 from plugins.napcat_plugin.ada.recv_handler import MetaEventType
 
@@ -12,9 +15,27 @@ class MetaEventHandler:
     """
 
     def __init__(self):
+        self.server_connection: Server.ServerConnection = None
         self.interval = global_config.napcat_server.heartbeat_interval
         self._interval_checking = False
 
+    async def set_server_connection(self, server_connection: Server.ServerConnection) -> None:
+        """设置Napcat连接"""
+        self.server_connection = server_connection
+
+    def record_heartbeat(self, message: dict) -> None:
+        """
+        读取循环收到元事件时立即调用，记录心跳时间
+
+        不等事件经过分片队列再记录，避免分片积压（如等待较慢的请求）时误判心跳超时而断开正常的连接
+        """
+        if message.get("meta_event_type") != MetaEventType.heartbeat:
+            return
+        status = message.get("status") or {}
+        if status.get("online") and status.get("good"):
+            self.last_heart_beat = time.time()
+            self.interval = message.get("interval") / 1000
+
     async def handle_meta_event(self, message: dict) -> None:
         event_type = message.get("meta_event_type")
         if event_type == MetaEventType.lifecycle:
@@ -23,27 +44,35 @@ class MetaEventHandler:
                 self_id = message.get("self_id")
                 self.last_heart_beat = time.time()
                 logger.success(f"Bot {self_id} 连接成功")
-                asyncio.create_task(self.check_heartbeat(self_id))
+                if not self._interval_checking:
+                    asyncio.create_task(self.check_heartbeat(self_id))
+                # 自身信息只在重连后变化，在连接建立时获取一次并缓存在连接上
+                if self.server_connection and not await get_self_info(self.server_connection, refresh=True):
+                    logger.warning("连接建立时获取自身信息失败，将在首次使用时重试")
         elif event_type == MetaEventType.heartbeat:
             if message["status"].get("online") and message["status"].get("good"):
+                # 心跳时间已在收到时由record_heartbeat记录
                 if not self._interval_checking:
-                    asyncio.create_task(self.check_heartbeat())
-                self.last_heart_beat = time.time()
-                self.interval = message.get("interval") / 1000
+                    asyncio.create_task(self.check_heartbeat(message.get("self_id")))
             else:
                 self_id = message.get("self_id")
                 logger.warning(f"Bot {self_id} Napcat 端异常！")
 
     async def check_heartbeat(self, id: int) -> None:
         self._interval_checking = True
-        while True:
-            now_time = time.time()
-            if now_time - self.last_heart_beat > self.interval * 2:
-                logger.error(f"Bot {id} 可能发生了连接断开，被下线，或者Napcat卡死！")
-                break
-            else:
-                logger.debug("心跳正常")
-            await asyncio.sleep(self.interval)
+        try:
+            while True:
+                now_time = time.time()
+                if now_time - self.last_heart_beat > self.interval * 2:
+                    logger.error(f"Bot {id} 可能发生了连接断开，被下线，或者Napcat卡死！")
+                    # 连接可能仍未关闭，主动断开使等待中的请求立即失败，并促使Napcat重连
+                    await connection_supervisor.close_stale(self.server_connection, "心跳超时")
+                    break
+                else:
+                    logger.debug("心跳正常")
+                await asyncio.sleep(self.interval)
+        finally:
+            self._interval_checking = False
 
 
 meta_event_handler = MetaEventHandler()
@@ -7,6 +7,7 @@ from typing import Tuple, Optional
 from plugins.napcat_plugin.ada.logger import logger
 from plugins.napcat_plugin.ada.config import global_config
 from plugins.napcat_plugin.ada.database import BanUser, db_manager, is_identical
+from plugins.napcat_plugin.ada.cache import group_info_cache, member_info_cache
 from plugins.napcat_plugin.ada.recv_handler import NoticeType, ACCEPT_FORMAT
 from plugins.napcat_plugin.ada.recv_handler.message_sending import message_send_instance
 from plugins.napcat_plugin.ada.recv_handler.message_handler import message_handler
@@ -17,6 +18,7 @@ from plugins.napcat_plugin.ada.utils import (
     get_member_info,
     get_self_info,
     get_stranger_info,
+    invalidate_self_info,
     read_ban_list,
 )
 
@@ -71,8 +73,36 @@ class NoticeHandler:
         self.lifted_list.append(ban_record)
         db_manager.delete_ban_record(ban_record)  # 删除数据库中的记录
 
+    def _invalidate_cache(self, raw_message: dict) -> None:
+        """
+        根据群相关通知使缓存失效
+        """
+        notice_type = raw_message.get("notice_type")
+        group_id = raw_message.get("group_id")
+        user_id = raw_message.get("user_id")
+        if not group_id:
+            return
+        if notice_type in (NoticeType.group_increase, NoticeType.group_decrease):
+            group_info_cache.invalidate(group_id)  # 成员数变化
+            member_info_cache.invalidate((group_id, user_id))
+            if notice_type == NoticeType.group_decrease and user_id == raw_message.get("self_id"):
+                # 自身退群或被踢出，该群的成员信息全部作废
+                member_info_cache.invalidate_where(lambda key: key[0] == group_id)
+        elif notice_type == NoticeType.group_card:
+            member_info_cache.invalidate((group_id, user_id))
+            if user_id == raw_message.get("self_id") and self.server_connection:
+                invalidate_self_info(self.server_connection)  # 自身资料变更
+        elif notice_type == NoticeType.group_ban:
+            if user_id == 0:
+                group_info_cache.invalidate(group_id)  # 全体禁言状态变化
+            else:
+                member_info_cache.invalidate((group_id, user_id))  # 禁言时间变化
+        elif notice_type == NoticeType.notify and raw_message.get("sub_type") == NoticeType.Notify.group_name:
+            group_info_cache.invalidate(group_id)
+
     async def handle_notice(self, raw_message: dict) -> None:
         notice_type = raw_message.get("notice_type")
+        self._invalidate_cache(raw_message)
         # message_time: int = raw_message.get("time")
         message_time: float = time.time()  # 应可乐要求，现在是float了
 
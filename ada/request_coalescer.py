@@ -0,0 +1,56 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+from plugins.napcat_plugin.ada.logger import logger
+
+
+class RequestCoalescer:
+    """
+    合并相同的在途请求（single-flight）
+
+    相同key的请求在第一个请求完成前只会真正发出一次，其余调用者共享同一个结果或异常。
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+        self.total_calls: int = 0
+        """经过合并层的调用总数"""
+        self.deduplicated_calls: int = 0
+        """因已有相同在途请求而被合并的调用数"""
+
+    async def run(self, key: Hashable, request_factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        执行请求，若已有相同key的请求在途则直接等待其结果
+        Parameters:
+            key: Hashable: 请求的唯一标识
+            request_factory: Callable: 用于真正发出请求的协程工厂
+        Returns:
+            Any: 请求结果
+        """
+        self.total_calls += 1
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.create_task(request_factory())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self.deduplicated_calls += 1
+            logger.trace(f"请求 {key} 已在途，合并等待")
+        # shield: 单个调用者被取消时不影响共享同一请求的其他调用者
+        return await asyncio.shield(task)
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取合并统计信息"""
+        return {
+            "total_calls": self.total_calls,
+            "deduplicated_calls": self.deduplicated_calls,
+            "dedup_ratio": self.deduplicated_calls / self.total_calls if self.total_calls else 0.0,
+            "in_flight": self.in_flight,
+        }
+
+
+request_coalescer = RequestCoalescer()
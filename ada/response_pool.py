@@ -1,44 +1,117 @@
 import asyncio
+import heapq
 import time
-from typing import Dict
+from typing import Any, Dict, List, Optional, Tuple
 from plugins.napcat_plugin.ada.config import global_config
 from plugins.napcat_plugin.ada.logger import logger
 
-response_dict: Dict = {}
-response_time_dict: Dict = {}
+response_dict: Dict[str, asyncio.Future] = {}
+"""echo -> 等待该响应的Future，请求方与响应方谁先到谁创建"""
+response_time_dict: Dict[str, float] = {}
+"""echo -> 无人认领的响应存入的时间，仅记录已到达但尚未被取走的响应"""
+_expire_heap: List[Tuple[float, str]] = []
+"""按存入时间排序的过期索引，元素为 (存入时间, echo)"""
+_response_connection: Dict[str, int] = {}
+"""echo -> 发出该请求的连接的id，用于连接断开时让其上的请求立即失败"""
+
+
+def _get_future(echo_id: str) -> asyncio.Future:
+    """获取echo对应的Future，不存在时创建"""
+    future = response_dict.get(echo_id)
+    if future is None:
+        future = asyncio.get_running_loop().create_future()
+        response_dict[echo_id] = future
+    return future
+
+
+def expect_response(request_id: str, connection: Optional[Any] = None) -> None:
+    """
+    在发送请求前登记等待的响应，使读取方能在请求方开始等待前识别该响应
+    Parameters:
+        connection: 发出请求的连接，连接断开时可通过fail_pending_responses让请求立即失败
+    """
+    _get_future(request_id)
+    if connection is not None:
+        _response_connection[request_id] = id(connection)
+
+
+def discard_response(request_id: str) -> None:
+    """
+    放弃等待某个响应，用于请求发送失败的情况
+    """
+    if (future := response_dict.pop(request_id, None)) is not None and not future.done():
+        future.cancel()
+    response_time_dict.pop(request_id, None)
+    _response_connection.pop(request_id, None)
+
+
+def has_pending_response(request_id: str) -> bool:
+    """
+    判断是否有请求方在等待该响应
+    """
+    future = response_dict.get(request_id)
+    return future is not None and not future.done()
 
 
 async def get_response(request_id: str, timeout: int = 10) -> dict:
-    response = await asyncio.wait_for(_get_response(request_id), timeout)
-    _ = response_time_dict.pop(request_id)
+    future = _get_future(request_id)
+    try:
+        response = await asyncio.wait_for(future, timeout)
+    finally:
+        response_dict.pop(request_id, None)
+        response_time_dict.pop(request_id, None)
+        _response_connection.pop(request_id, None)
     logger.trace(f"响应信息id: {request_id} 已从响应字典中取出")
     return response
 
-async def _get_response(request_id: str) -> dict:
+
+def fail_pending_responses(connection: Any, error: Exception) -> int:
     """
-    内部使用的获取响应函数，主要用于在需要时获取响应
+    让某个连接上所有尚未收到响应的请求立即以error失败
+    Returns:
+        int: 失败的请求数
     """
-    while request_id not in response_dict:
-        await asyncio.sleep(0.2)
-    return response_dict.pop(request_id)
+    connection_id = id(connection)
+    failed = 0
+    for request_id in [key for key, owner in _response_connection.items() if owner == connection_id]:
+        del _response_connection[request_id]
+        future = response_dict.get(request_id)
+        if future is not None and not future.done():
+            future.set_exception(error)
+            failed += 1
+    return failed
+
 
 async def put_response(response: dict):
     echo_id = response.get("echo")
-    now_time = time.time()
-    response_dict[echo_id] = response
-    response_time_dict[echo_id] = now_time
+    future = _get_future(echo_id)
+    if future.done():
+        logger.warning(f"响应信息id: {echo_id} 重复，已忽略")
+        return
+    future.set_result(response)
+    if echo_id not in response_time_dict:
+        # 请求方可能还没开始等待，记录时间以便超时清理
+        now_time = time.time()
+        response_time_dict[echo_id] = now_time
+        heapq.heappush(_expire_heap, (now_time, echo_id))
     logger.trace(f"响应信息id: {echo_id} 已存入响应字典")
 
 
 async def check_timeout_response() -> None:
+    """定期清理无人认领的过期响应"""
     while True:
         cleaned_message_count: int = 0
-        now_time = time.time()
-        for echo_id, response_time in list(response_time_dict.items()):
-            if now_time - response_time > global_config.napcat_server.heartbeat_interval:
-                cleaned_message_count += 1
-                response_dict.pop(echo_id)
-                response_time_dict.pop(echo_id)
-                logger.warning(f"响应消息 {echo_id} 超时，已删除")
+        expire_before = time.time() - global_config.napcat_server.heartbeat_interval
+        # 过期索引按时间排序，只需从堆顶弹出已过期的部分
+        while _expire_heap and _expire_heap[0][0] < expire_before:
+            response_time, echo_id = heapq.heappop(_expire_heap)
+            if response_time_dict.get(echo_id) != response_time:
+                continue  # 已被取走
+            cleaned_message_count += 1
+            response_dict.pop(echo_id, None)
+            response_time_dict.pop(echo_id, None)
+            logger.warning(f"响应消息 {echo_id} 超时，已删除")
+        if not response_time_dict:
+            _expire_heap.clear()
         logger.info(f"已删除 {cleaned_message_count} 条超时响应消息")
         await asyncio.sleep(global_config.napcat_server.heartbeat_interval)
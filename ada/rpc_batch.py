@@ -0,0 +1,55 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List, Optional, Sequence, Tuple
+
+DEFAULT_BATCH_CONCURRENCY = 16
+"""批量请求默认同时等待响应的请求数"""
+
+
+@dataclass
+class BatchResult:
+    """批量请求中单个请求的结果，response与error只有一个不为None"""
+
+    action: str
+    response: Optional[dict] = None
+    """Napcat返回的完整响应"""
+    error: Optional[Exception] = None
+    """发送失败、超时或连接断开时的异常"""
+
+    @property
+    def ok(self) -> bool:
+        return self.response is not None and self.response.get("status") == "ok"
+
+    @property
+    def data(self):
+        return self.response.get("data") if self.response is not None else None
+
+
+async def run_batch(
+    requests: Sequence[Tuple[str, dict]],
+    send: Callable[[str, dict], Awaitable[dict]],
+    concurrency: int = DEFAULT_BATCH_CONCURRENCY,
+) -> List[BatchResult]:
+    """
+    批量发送请求
+
+    请求按顺序连续写入连接，不等待前一个请求的响应，同时等待响应的请求数不超过concurrency，
+    有请求完成后立即发送下一个。单个请求失败不影响其他请求。
+    Parameters:
+        requests: (action, params) 列表
+        send: 发送单个请求并返回响应的函数，如napcat_request
+        concurrency: 同时等待响应的请求数上限
+    Returns:
+        List[BatchResult]: 与requests顺序一致的结果
+    """
+    # Semaphore按等待顺序唤醒，因此请求的发送顺序与列表顺序一致
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run_one(action: str, params: dict) -> BatchResult:
+        async with semaphore:
+            try:
+                return BatchResult(action, response=await send(action, params))
+            except Exception as e:
+                return BatchResult(action, error=e)
+
+    return list(await asyncio.gather(*(run_one(action, params) for action, params in requests)))
@@ -0,0 +1,147 @@
+import time
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, Optional
+
+from plugins.napcat_plugin.ada.config import global_config
+from plugins.napcat_plugin.ada.connection_supervisor import is_idempotent
+from plugins.napcat_plugin.ada.logger import logger
+from plugins.napcat_plugin.ada.rpc_metrics import bounded_label
+
+LATENCY_WINDOW = 200
+"""每种请求用于计算超时时间的最近响应耗时数量"""
+MIN_SAMPLES = 20
+"""样本少于该数量时使用调用方给出的超时时间"""
+RECOMPUTE_EVERY = 10
+"""每记录多少个样本重新计算一次超时时间"""
+
+
+class NapcatCircuitOpen(TimeoutError):
+    """
+    该请求已熔断，请求未发送
+
+    继承TimeoutError，调用方原有的超时处理（返回None、使用缓存等）同样适用
+    """
+
+
+class ActionGuard:
+    """单种请求的超时与熔断状态"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self):
+        self.latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self.adaptive_timeout: Optional[float] = None
+        """根据最近耗时计算出的超时时间，样本不足时为None"""
+        self._since_recompute: int = 0
+        self.state: str = self.CLOSED
+        self.consecutive_timeouts: int = 0
+        self.opened_at: float = 0.0
+        self.probing: bool = False
+        """半开状态下是否已有试探请求在进行"""
+        self.open_count: int = 0
+        self.rejected: int = 0
+
+    def observe(self, seconds: float) -> None:
+        self.latencies.append(seconds)
+        self._since_recompute += 1
+        if len(self.latencies) >= MIN_SAMPLES and self._since_recompute >= RECOMPUTE_EVERY:
+            self._since_recompute = 0
+            ordered = sorted(self.latencies)
+            p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+            self.adaptive_timeout = p99 * global_config.rpc.timeout_multiplier
+
+
+class RpcGuard:
+    """
+    Napcat请求的自适应超时与熔断
+
+    超时时间取该请求最近响应耗时p99的若干倍，限制在timeout_floor与调用方给出的超时时间之间；
+    超时的请求按实际等待时间计入样本，Napcat整体变慢时超时时间会随之增大。
+    同一种请求连续超时达到breaker_threshold次后熔断，熔断期间直接抛出NapcatCircuitOpen，
+    breaker_open_seconds秒后放行一个试探请求（使用调用方给出的完整超时时间），成功则恢复，失败则继续熔断。
+
+    只作用于只读请求。发送消息、上传文件等写请求超时后Napcat仍可能执行成功，
+    缩短超时或熔断只会让调用方误判失败并重复发送，因此始终使用调用方给出的超时时间且不计入熔断。
+    """
+
+    def __init__(self):
+        self.actions: Dict[str, ActionGuard] = defaultdict(ActionGuard)
+
+    def before_request(self, action: str, timeout: float) -> float:
+        """
+        请求发送前调用
+        Parameters:
+            timeout: 调用方给出的超时时间，作为上限
+        Returns:
+            float: 本次请求实际使用的超时时间
+        Raises:
+            NapcatCircuitOpen: 该请求已熔断
+        """
+        if not is_idempotent(action):
+            return timeout
+        action = bounded_label(self.actions, action)
+        guard = self.actions[action]
+        if guard.state == ActionGuard.OPEN:
+            if time.monotonic() - guard.opened_at < global_config.rpc.breaker_open_seconds:
+                guard.rejected += 1
+                raise NapcatCircuitOpen(f"请求 {action} 已熔断")
+            guard.state = ActionGuard.HALF_OPEN
+        if guard.state == ActionGuard.HALF_OPEN:
+            if guard.probing:
+                guard.rejected += 1
+                raise NapcatCircuitOpen(f"请求 {action} 已熔断，正在试探恢复")
+            guard.probing = True
+            return timeout
+        if not global_config.rpc.adaptive_timeout or guard.adaptive_timeout is None:
+            return timeout
+        return min(timeout, max(global_config.rpc.timeout_floor, guard.adaptive_timeout))
+
+    def after_request(self, action: str, outcome: str, seconds: float) -> None:
+        """
+        请求结束后调用
+        Parameters:
+            outcome: 与rpc_metrics相同的请求结果，只有timeout计为失败，disconnected等由连接管理处理
+        """
+        if not is_idempotent(action):
+            return
+        action = bounded_label(self.actions, action)
+        guard = self.actions[action]
+        was_probe = guard.state == ActionGuard.HALF_OPEN and guard.probing
+        if was_probe:
+            guard.probing = False
+        if outcome in ("ok", "failed"):
+            guard.observe(seconds)
+            guard.consecutive_timeouts = 0
+            if was_probe:
+                guard.state = ActionGuard.CLOSED
+                logger.info(f"请求 {action} 试探成功，已解除熔断")
+        elif outcome == "timeout":
+            guard.observe(seconds)
+            guard.consecutive_timeouts += 1
+            threshold = global_config.rpc.breaker_threshold
+            if was_probe or (threshold > 0 and guard.consecutive_timeouts >= threshold):
+                if guard.state != ActionGuard.OPEN:
+                    guard.open_count += 1
+                guard.state = ActionGuard.OPEN
+                guard.opened_at = time.monotonic()
+                logger.warning(
+                    f"请求 {action} 连续超时 {guard.consecutive_timeouts} 次，"
+                    f"熔断 {global_config.rpc.breaker_open_seconds} 秒"
+                )
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            action: {
+                "state": guard.state,
+                "timeout_seconds": round(guard.adaptive_timeout, 3) if guard.adaptive_timeout is not None else None,
+                "consecutive_timeouts": guard.consecutive_timeouts,
+                "open_count": guard.open_count,
+                "rejected": guard.rejected,
+            }
+            for action, guard in sorted(self.actions.items())
+        }
+
+
+rpc_guard = RpcGuard()
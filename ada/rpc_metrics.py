@@ -0,0 +1,179 @@
+import re
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Any, Dict, List, Mapping, Tuple
+
+LATENCY_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+"""延迟直方图的桶上界，单位为秒，最后还有一个+Inf桶"""
+
+STAGE_BUCKETS: Tuple[float, ...] = (0.0001, 0.0005, 0.001, 0.0025) + LATENCY_BUCKETS
+"""处理阶段耗时的桶上界，解码、过滤等阶段通常不到1毫秒，需要更细的桶"""
+
+OUTCOMES = ("ok", "failed", "timeout", "disconnected", "error")
+"""
+请求结果：
+- ok: Napcat返回status为ok
+- failed: 收到响应但status不为ok
+- timeout: 等待响应超时
+- disconnected: 发送时或等待响应期间连接断开
+- error: 发送失败等其他异常
+"""
+
+
+MAX_LABEL_VALUES = 100
+"""每个统计最多记录的action数，超出后记入OTHER_LABEL，避免批量请求等传入任意action时无限增长"""
+OTHER_LABEL = "other"
+_LABEL_VALUE_PATTERN = re.compile(r"[A-Za-z0-9_.:-]{1,64}")
+
+
+def bounded_label(known: Mapping[str, Any], value: str) -> str:
+    """
+    将action等标签值限制在有限的集合内
+    Parameters:
+        known: 以标签值为键的已有统计
+    Returns:
+        str: 已记录过的值原样返回；格式不合法或已达到MAX_LABEL_VALUES时返回OTHER_LABEL
+    """
+    if value in known:
+        return value
+    if len(known) >= MAX_LABEL_VALUES or not isinstance(value, str) or not _LABEL_VALUE_PATTERN.fullmatch(value):
+        return OTHER_LABEL
+    return value
+
+
+def escape_label_value(value: Any) -> str:
+    """按Prometheus文本格式转义标签值"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_ms(value: float | None) -> str:
+    """格式化snapshot中的毫秒数，无数据时返回 -"""
+    return f"{value}ms" if value is not None else "-"
+
+
+class ActionMetrics:
+    """单个action的统计"""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.bucket_counts: List[int] = [0] * (len(buckets) + 1)
+        self.latency_sum: float = 0.0
+        self.latency_count: int = 0
+        self.outcomes: Dict[str, int] = dict.fromkeys(OUTCOMES, 0)
+        self.in_flight: int = 0
+
+    def observe_latency(self, seconds: float) -> None:
+        self.bucket_counts[bisect_left(self.buckets, seconds)] += 1
+        self.latency_sum += seconds
+        self.latency_count += 1
+
+    def quantile(self, q: float) -> float | None:
+        """按直方图估算分位数（桶内线性插值），单位为秒"""
+        if not self.latency_count:
+            return None
+        rank = q * self.latency_count
+        cumulative = 0
+        lower_bound = 0.0
+        for index, count in enumerate(self.bucket_counts):
+            if count and cumulative + count >= rank:
+                if index == len(self.buckets):
+                    return self.buckets[-1]  # 落在+Inf桶中，只能给出下界
+                return lower_bound + (self.buckets[index] - lower_bound) * (rank - cumulative) / count
+            cumulative += count
+            if index < len(self.buckets):
+                lower_bound = self.buckets[index]
+        return self.buckets[-1]
+
+    def snapshot(self) -> Dict[str, Any]:
+        def to_ms(seconds: float | None) -> float | None:
+            return round(seconds * 1000, 2) if seconds is not None else None
+
+        return {
+            "requests": sum(self.outcomes.values()),
+            "in_flight": self.in_flight,
+            **self.outcomes,
+            "mean_ms": to_ms(self.latency_sum / self.latency_count) if self.latency_count else None,
+            "p50_ms": to_ms(self.quantile(0.5)),
+            "p90_ms": to_ms(self.quantile(0.9)),
+            "p99_ms": to_ms(self.quantile(0.99)),
+        }
+
+
+class RpcMetrics:
+    """
+    Napcat请求统计
+
+    按action统计从发送到收到响应的延迟直方图、各类结果的次数，以及当前在途的请求数。
+    也用于统计各类事件的处理耗时与处理链路中各阶段的耗时，此时action为事件类型或阶段名。
+    """
+
+    def __init__(
+        self,
+        prefix: str = "napcat_rpc",
+        label: str = "action",
+        description: str = "Napcat请求",
+        buckets: Tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        self.prefix = prefix
+        """Prometheus指标名前缀"""
+        self.label = label
+        """Prometheus中action对应的标签名"""
+        self.description = description
+        self.actions: Dict[str, ActionMetrics] = defaultdict(lambda: ActionMetrics(buckets))
+
+    def begin(self, action: str) -> None:
+        self.actions[bounded_label(self.actions, action)].in_flight += 1
+
+    def end(self, action: str, seconds: float, outcome: str) -> None:
+        metrics = self.actions[bounded_label(self.actions, action)]
+        metrics.in_flight -= 1
+        metrics.outcomes[outcome] += 1
+        if outcome in ("ok", "failed"):
+            metrics.observe_latency(seconds)
+
+    def observe(self, action: str, seconds: float) -> None:
+        """直接记录一次已完成的耗时，不经过begin"""
+        metrics = self.actions[bounded_label(self.actions, action)]
+        metrics.outcomes["ok"] += 1
+        metrics.observe_latency(seconds)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """获取每个action的统计摘要，延迟单位为毫秒"""
+        return {action: metrics.snapshot() for action, metrics in sorted(self.actions.items())}
+
+    def render_prometheus(self) -> str:
+        """导出为Prometheus文本格式"""
+        prefix, label = self.prefix, self.label
+        lines = [
+            f"# HELP {prefix}_duration_seconds {self.description}耗时",
+            f"# TYPE {prefix}_duration_seconds histogram",
+        ]
+        for action, metrics in sorted(self.actions.items()):
+            action = escape_label_value(action)
+            cumulative = 0
+            for upper_bound, count in zip((*metrics.buckets, "+Inf"), metrics.bucket_counts, strict=True):
+                cumulative += count
+                lines.append(f'{prefix}_duration_seconds_bucket{{{label}="{action}",le="{upper_bound}"}} {cumulative}')
+            lines.append(f'{prefix}_duration_seconds_sum{{{label}="{action}"}} {metrics.latency_sum}')
+            lines.append(f'{prefix}_duration_seconds_count{{{label}="{action}"}} {metrics.latency_count}')
+        lines += [
+            f"# HELP {prefix}_requests_total {self.description}次数，按结果分类",
+            f"# TYPE {prefix}_requests_total counter",
+        ]
+        for action, metrics in sorted(self.actions.items()):
+            action = escape_label_value(action)
+            for outcome, count in metrics.outcomes.items():
+                lines.append(f'{prefix}_requests_total{{{label}="{action}",outcome="{outcome}"}} {count}')
+        lines += [
+            f"# HELP {prefix}_in_flight 当前进行中的{self.description}数",
+            f"# TYPE {prefix}_in_flight gauge",
+        ]
+        for action, metrics in sorted(self.actions.items()):
+            action = escape_label_value(action)
+            lines.append(f'{prefix}_in_flight{{{label}="{action}"}} {metrics.in_flight}')
+        return "\n".join(lines) + "\n"
+
+
+rpc_metrics = RpcMetrics()
+handler_metrics = RpcMetrics(prefix="napcat_handler", label="post_type", description="事件处理")
+"""按post_type统计的事件处理耗时，结果只有ok与error"""
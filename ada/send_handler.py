@@ -1,6 +1,6 @@
-import json
 import websockets as Server
-import uuid
+import json
+from collections import OrderedDict
 from maim_message import (
     UserInfo,
     GroupInfo,
@@ -12,28 +12,46 @@ from typing import Dict, Any, Tuple
 
 from plugins.napcat_plugin.ada import CommandType
 from plugins.napcat_plugin.ada.config import global_config
-from plugins.napcat_plugin.ada.response_pool import get_response
 from plugins.napcat_plugin.ada.logger import logger
-from plugins.napcat_plugin.ada.utils import get_image_format, convert_image_to_gif
+from plugins.napcat_plugin.ada.utils import get_image_format, convert_image_to_gif_async, napcat_request
+from plugins.napcat_plugin.ada.media_cache import media_cache
+from plugins.napcat_plugin.ada.traffic_recorder import traffic_recorder
 from plugins.napcat_plugin.ada.recv_handler.message_sending import message_send_instance
+from plugins.napcat_plugin.ada.tracing import Trace, current_trace, trace_span, traced
 
 
 class SendHandler:
+    SENT_MESSAGE_ID_LIMIT = 2000
+    """记录的最近发送消息ID数量上限"""
+
     def __init__(self):
         self.server_connection: Server.ServerConnection = None
+        self.sent_message_ids: OrderedDict[str, None] = OrderedDict()
+        """最近由机器人发送的消息ID，用于识别回复机器人的消息"""
 
     async def set_server_connection(self, server_connection: Server.ServerConnection) -> None:
         """设置Napcat连接"""
         self.server_connection = server_connection
 
     async def handle_message(self, raw_message_base_dict: dict) -> None:
-        raw_message_base: MessageBase = MessageBase.from_dict(raw_message_base_dict)
-        message_segment: Seg = raw_message_base.message_segment
-        logger.info("接收到来自MaiBot的消息，处理中")
-        if message_segment.type == "command":
-            return await self.send_command(raw_message_base)
-        else:
-            return await self.send_normal_message(raw_message_base)
+        trace = Trace("send")
+        token = current_trace.set(trace)
+        try:
+            if traffic_recorder.enabled:
+                traffic_recorder.record("maibot", json.dumps(raw_message_base_dict, ensure_ascii=False))
+            raw_message_base: MessageBase = MessageBase.from_dict(raw_message_base_dict)
+            trace.mark("decode")
+            trace.label = f"message_id={raw_message_base.message_info.message_id}"
+            message_segment: Seg = raw_message_base.message_segment
+            logger.info("接收到来自MaiBot的消息，处理中")
+            if message_segment.type == "command":
+                return await self.send_command(raw_message_base)
+            else:
+                return await self.send_normal_message(raw_message_base)
+        finally:
+            current_trace.reset(token)
+            trace.mark("handle")
+            trace.finish()
 
     async def send_normal_message(self, raw_message_base: MessageBase) -> None:
         """
@@ -49,7 +67,8 @@ class SendHandler:
         id_name: str = None
         processed_message: list = []
         try:
-            processed_message = await self.handle_seg_recursive(message_segment)
+            with trace_span("build_payload"):
+                processed_message = await self.handle_seg_recursive(message_segment)
         except Exception as e:
             logger.error(f"处理消息时发生错误: {e}")
             return
@@ -82,10 +101,22 @@ class SendHandler:
         if response.get("status") == "ok":
             logger.info("消息发送成功")
             qq_message_id = response.get("data", {}).get("message_id")
+            self._record_sent_message(qq_message_id)
             await self.message_sent_back(raw_message_base, qq_message_id)
         else:
             logger.warning(f"消息发送失败，napcat返回：{str(response)}")
 
+    def _record_sent_message(self, message_id) -> None:
+        if message_id is None:
+            return
+        self.sent_message_ids[str(message_id)] = None
+        while len(self.sent_message_ids) > self.SENT_MESSAGE_ID_LIMIT:
+            self.sent_message_ids.popitem(last=False)
+
+    def is_sent_message(self, message_id) -> bool:
+        """判断消息是否为机器人最近发送的消息"""
+        return message_id is not None and str(message_id) in self.sent_message_ids
+
     async def send_command(self, raw_message_base: MessageBase) -> None:
         """
         处理命令类
@@ -140,12 +171,12 @@ class SendHandler:
             if not seg_data.data:
                 return []
             for seg in seg_data.data:
-                payload = self.process_message_by_type(seg, payload)
+                payload = await self.process_message_by_type(seg, payload)
         else:
-            payload = self.process_message_by_type(seg_data, payload)
+            payload = await self.process_message_by_type(seg_data, payload)
         return payload
 
-    def process_message_by_type(self, seg: Seg, payload: list) -> list:
+    async def process_message_by_type(self, seg: Seg, payload: list) -> list:
         # sourcery skip: reintroduce-else, swap-if-else-branches, use-named-expression
         new_payload = payload
         if seg.type == "reply":
@@ -165,7 +196,7 @@ class SendHandler:
             new_payload = self.build_payload(payload, self.handle_image_message(image), False)
         elif seg.type == "emoji":
             emoji = seg.data
-            new_payload = self.build_payload(payload, self.handle_emoji_message(emoji), False)
+            new_payload = self.build_payload(payload, await self.handle_emoji_message(emoji), False)
         elif seg.type == "voice":
             voice = seg.data
             new_payload = self.build_payload(payload, self.handle_voice_message(voice), False)
@@ -217,12 +248,20 @@ class SendHandler:
             },
         }  # base64 编码的图片
 
-    def handle_emoji_message(self, encoded_emoji: str) -> dict:
+    async def handle_emoji_message(self, encoded_emoji: str) -> dict:
         """处理表情消息"""
-        encoded_image = encoded_emoji
-        image_format = get_image_format(encoded_emoji)
-        if image_format != "gif":
-            encoded_image = convert_image_to_gif(encoded_emoji)
+        # 同一表情包会被反复发送，按内容哈希缓存转换结果
+        cache_key = f"gif:{media_cache.content_hash(encoded_emoji)}"
+        encoded_image = media_cache.get_memory(cache_key)
+        if encoded_image is None:
+            encoded_image = encoded_emoji
+            image_format = get_image_format(encoded_emoji)
+            if image_format != "gif":
+                encoded_image = await convert_image_to_gif_async(encoded_emoji)
+            if encoded_image is None:
+                encoded_image = encoded_emoji  # 转换失败时发送原图，不缓存，下次发送时重新转换
+            else:
+                media_cache.put_memory(cache_key, encoded_image)
         return {
             "type": "image",
             "data": {
@@ -425,12 +464,10 @@ class SendHandler:
             },
         )
 
+    @traced("napcat_send")
     async def send_message_to_napcat(self, action: str, params: dict) -> dict:
-        request_uuid = str(uuid.uuid4())
-        payload = json.dumps({"action": action, "params": params, "echo": request_uuid})
-        await self.server_connection.send(payload)
         try:
-            response = await get_response(request_uuid)
+            response = await napcat_request(self.server_connection, action, params)
         except TimeoutError:
             logger.error("发送消息超时，未收到响应")
             return {"status": "error", "message": "timeout"}
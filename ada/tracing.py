@@ -0,0 +1,107 @@
+import functools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional, TypeVar
+
+from plugins.napcat_plugin.ada.config import global_config
+from plugins.napcat_plugin.ada.logger import logger
+from plugins.napcat_plugin.ada.rpc_metrics import STAGE_BUCKETS, RpcMetrics
+
+T = TypeVar("T")
+
+
+class Trace:
+    """
+    单个事件/回复的处理链路
+
+    phases为按顺序经过的阶段（接收、解码、排队、处理），各阶段首尾相接；
+    spans为处理过程中的子阶段（查询群信息、下载媒体、发送到MaiBot等），
+    子阶段之间可能嵌套或并发（如合并转发中并行下载的图片），耗时分别累计。
+    """
+
+    def __init__(self, kind: str, started: Optional[float] = None, label: str = ""):
+        self.kind = kind
+        """链路类型，入站事件为post_type，发往Napcat的回复为send"""
+        self.label = label
+        """输出慢链路日志时用于定位的信息，如消息ID"""
+        self.started = started if started is not None else time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.spans: Dict[str, float] = {}
+        self._last = self.started
+        self.finished = False
+
+    def mark(self, phase: str, at: Optional[float] = None) -> None:
+        """结束当前阶段，耗时为距上一次mark（或链路开始）的时间，at为阶段实际结束的时间，默认为现在"""
+        now = at if at is not None else time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + now - self._last
+        self._last = now
+
+    def add_span(self, stage: str, seconds: float) -> None:
+        self.spans[stage] = self.spans.get(stage, 0.0) + seconds
+
+    def finish(self) -> None:
+        """结束链路，记录到统计中，超过阈值时输出各阶段耗时"""
+        if self.finished:
+            return
+        self.finished = True
+        total = time.perf_counter() - self.started
+        for phase, seconds in self.phases.items():
+            trace_metrics.observe(f"{self.kind}.{phase}", seconds)
+        for stage, seconds in self.spans.items():
+            trace_metrics.observe(f"{self.kind}.{stage}", seconds)
+        trace_metrics.observe(f"{self.kind}.total", total)
+        threshold = global_config.debug.slow_trace_threshold
+        if threshold > 0 and total >= threshold:
+            target = f"{self.kind} {self.label}".strip()
+            logger.warning(f"处理较慢的{target} 总耗时 {total * 1000:.0f}ms: {self.breakdown()}")
+
+    def discard(self) -> None:
+        """事件未经处理即被丢弃，只记录其存在的时间（shed阶段），不计入total"""
+        if self.finished:
+            return
+        self.finished = True
+        trace_metrics.observe(f"{self.kind}.shed", time.perf_counter() - self.started)
+
+    def breakdown(self) -> str:
+        def join(durations: Dict[str, float]) -> str:
+            return ", ".join(f"{name} {seconds * 1000:.1f}ms" for name, seconds in durations.items())
+
+        if not self.spans:
+            return join(self.phases)
+        return f"{join(self.phases)}（其中 {join(self.spans)}）"
+
+
+current_trace: ContextVar[Optional[Trace]] = ContextVar("napcat_trace", default=None)
+"""当前正在处理的链路，asyncio任务创建时会复制当前值，因此并发的子任务也会计入同一链路"""
+
+trace_metrics = RpcMetrics(prefix="napcat_trace_stage", label="stage", description="处理阶段", buckets=STAGE_BUCKETS)
+"""按 "链路类型.阶段" 统计的耗时，total为整条链路的耗时"""
+
+
+@contextmanager
+def trace_span(stage: str) -> Iterator[None]:
+    """将代码块的耗时计入当前链路的子阶段，没有链路时不做任何事"""
+    trace = current_trace.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add_span(stage, time.perf_counter() - start)
+
+
+def traced(stage: str) -> Callable[[Callable[..., Awaitable[T]]], Callable[..., Awaitable[T]]]:
+    """将异步函数的耗时计入当前链路的子阶段"""
+
+    def decorator(func: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> T:
+            with trace_span(stage):
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,75 @@
+import gzip
+import json
+import os
+import queue
+import threading
+import time
+from typing import Optional
+
+from plugins.napcat_plugin.ada.logger import logger
+
+PLUGIN_ROOT = os.path.join(os.path.dirname(__file__), "..")
+
+
+class TrafficRecorder:
+    """
+    记录与Napcat之间的原始收发数据，用于回放测试
+
+    每行一条记录：{"t": 时间戳, "dir": 方向, "frame": 原始数据}
+    方向为 in（Napcat发来的事件与响应）、out（发给Napcat的请求）、maibot（MaiBot发来的消息）。
+    压缩与写入在后台线程中进行，不会阻塞事件循环。
+    """
+
+    def __init__(self):
+        self._queue: Optional[queue.SimpleQueue] = None
+        self._thread: Optional[threading.Thread] = None
+        self.path: Optional[str] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._queue is not None
+
+    def open(self, path: str) -> None:
+        """开始记录，文件已存在时追加"""
+        if self.enabled:
+            return
+        self.path = path if os.path.isabs(path) else os.path.join(PLUGIN_ROOT, path)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._write_loop, args=(self.path, self._queue), daemon=True)
+        self._thread.start()
+        logger.warning(f"已开启流量记录，记录中包含完整的聊天内容，文件: {self.path}")
+
+    def record(self, direction: str, frame: str | bytes) -> None:
+        if self._queue is None:
+            return
+        if isinstance(frame, bytes):
+            frame = frame.decode("utf-8", errors="replace")
+        self._queue.put((time.time(), direction, frame))
+
+    def close(self) -> None:
+        """停止记录并等待已排队的数据写入完成"""
+        if self._queue is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._queue = None
+        self._thread = None
+        logger.info(f"流量记录已保存到 {self.path}")
+
+    @staticmethod
+    def _write_loop(path: str, records: queue.SimpleQueue) -> None:
+        try:
+            with gzip.open(path, "at", encoding="utf-8") as f:
+                while (item := records.get()) is not None:
+                    timestamp, direction, frame = item
+                    f.write(json.dumps({"t": timestamp, "dir": direction, "frame": frame}, ensure_ascii=False))
+                    f.write("\n")
+        except Exception as e:
+            logger.error(f"写入流量记录失败: {e}")
+            # 继续取出剩余记录，避免队列无限增长
+            while records.get() is not None:
+                pass
+
+
+traffic_recorder = TrafficRecorder()
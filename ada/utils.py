@@ -2,47 +2,168 @@ import websockets as Server
 import json
 import base64
 import uuid
-import urllib3
-import ssl
 import io
+import asyncio
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 
+from plugins.napcat_plugin.ada.config import global_config
 from plugins.napcat_plugin.ada.database import BanUser, db_manager
-from plugins.napcat_plugin.ada.logger import logger
-from plugins.napcat_plugin.ada.response_pool import get_response
+from plugins.napcat_plugin.ada.logger import logger, lazy_debug, truncate
+from plugins.napcat_plugin.ada.response_pool import get_response, expect_response, discard_response
+from plugins.napcat_plugin.ada.request_coalescer import request_coalescer
+from plugins.napcat_plugin.ada.cache import group_info_cache, member_info_cache
+from plugins.napcat_plugin.ada.http_client import media_downloader
+from plugins.napcat_plugin.ada.media_cache import media_cache
+from plugins.napcat_plugin.ada.traffic_recorder import traffic_recorder
+from plugins.napcat_plugin.ada.rpc_metrics import rpc_metrics
+from plugins.napcat_plugin.ada.tracing import traced
+from plugins.napcat_plugin.ada.connection_supervisor import NapcatConnectionClosed, connection_supervisor, is_idempotent
+from plugins.napcat_plugin.ada.rpc_batch import DEFAULT_BATCH_CONCURRENCY, BatchResult, run_batch
+from plugins.napcat_plugin.ada.rpc_guard import NapcatCircuitOpen, rpc_guard
 
 from PIL import Image
-from typing import Union, List, Tuple, Optional
+from typing import Any, Callable, Union, List, Sequence, Tuple, Optional
 
 
-class SSLAdapter(urllib3.PoolManager):
-    def __init__(self, *args, **kwargs):
-        context = ssl.create_default_context()
-        context.set_ciphers("DEFAULT@SECLEVEL=1")
-        context.minimum_version = ssl.TLSVersion.TLSv1_2
-        kwargs["ssl_context"] = context
-        super().__init__(*args, **kwargs)
+_self_info_cache: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+"""连接 -> (过期时间, 该连接登录账号的自身信息)，连接释放后自动清除"""
+SELF_INFO_TTL = 600
+"""自身信息的缓存时间（秒），Napcat不会推送自身昵称的变更，需要定期重新获取"""
 
+_image_executor: Optional[ThreadPoolExecutor] = None
+"""图片处理使用的线程池/进程池，首次使用时创建"""
 
-async def get_group_info(websocket: Server.ServerConnection, group_id: int) -> dict | None:
+IMAGE_SIGNATURES: List[Tuple[bytes, int, str]] = [
+    (b"GIF87a", 0, "gif"),
+    (b"GIF89a", 0, "gif"),
+    (b"\x89PNG\r\n\x1a\n", 0, "png"),
+    (b"\xff\xd8\xff", 0, "jpeg"),
+    (b"WEBP", 8, "webp"),
+    (b"BM", 0, "bmp"),
+]
+"""(魔数, 偏移, 格式)"""
+
+
+async def napcat_request(websocket: Server.ServerConnection, action: str, params: dict, timeout: int = 10) -> dict:
+    """
+    向Napcat发送一个请求并等待其响应
+    Parameters:
+        websocket: WebSocket连接对象
+        action: str: 请求的动作
+        params: dict: 请求参数
+        timeout: int: 超时时间（秒），开启自适应超时时为上限
+    Returns:
+        dict: Napcat返回的完整响应
+    Raises:
+        TimeoutError: 超时未收到响应，或该请求已熔断（NapcatCircuitOpen）
+        NapcatConnectionClosed: 连接已断开；只读请求会先等待Napcat重连并重新发送一次
+    """
+    try:
+        return await _send_request(websocket, action, params, timeout)
+    except NapcatConnectionClosed:
+        if not is_idempotent(action):
+            raise
+        new_connection = await connection_supervisor.wait_for_connection(stale=websocket)
+        logger.info(f"与Napcat的连接已恢复，重新发送请求 {action}")
+        connection_supervisor.replayed += 1
+        return await _send_request(new_connection, action, params, timeout)
+
+
+async def _send_request(websocket: Server.ServerConnection, action: str, params: dict, timeout: int) -> dict:
+    request_timeout = rpc_guard.before_request(action, timeout)
+    request_uuid = str(uuid.uuid4())
+    payload = json.dumps({"action": action, "params": params, "echo": request_uuid})
+    expect_response(request_uuid, websocket)
+    traffic_recorder.record("out", payload)
+    rpc_metrics.begin(action)
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        try:
+            await websocket.send(payload)
+        except Server.ConnectionClosed as e:
+            discard_response(request_uuid)
+            raise NapcatConnectionClosed(f"与Napcat的连接已断开: {e}") from e
+        except Exception:
+            discard_response(request_uuid)
+            raise
+        response = await get_response(request_uuid, request_timeout)
+        outcome = "ok" if response.get("status") == "ok" else "failed"
+        return response
+    except TimeoutError:
+        outcome = "timeout"
+        raise
+    except NapcatConnectionClosed:
+        outcome = "disconnected"
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        rpc_metrics.end(action, elapsed, outcome)
+        rpc_guard.after_request(action, outcome, elapsed)
+
+
+async def napcat_batch_request(
+    websocket: Server.ServerConnection,
+    requests: Sequence[Tuple[str, dict]],
+    concurrency: int = DEFAULT_BATCH_CONCURRENCY,
+    timeout: int = 10,
+) -> List[BatchResult]:
+    """
+    批量向Napcat发送请求，请求连续写入连接后并发等待响应
+    Parameters:
+        websocket: WebSocket连接对象
+        requests: (action, params) 列表
+        concurrency: 同时等待响应的请求数上限
+        timeout: 单个请求的超时时间（秒）
+    Returns:
+        List[BatchResult]: 与requests顺序一致的结果，单个请求的异常保存在对应结果中
+    """
+    return await run_batch(
+        requests, lambda action, params: napcat_request(websocket, action, params, timeout), concurrency
+    )
+
+
+async def coalesced_napcat_request(
+    websocket: Server.ServerConnection, action: str, params: dict, timeout: int = 10
+) -> dict:
+    """
+    与napcat_request相同，但相同(action, params)的在途请求只会发送一次
+
+    仅适用于没有副作用的查询类请求
+    """
+    key = (id(websocket), action, json.dumps(params, sort_keys=True))
+    return await request_coalescer.run(key, lambda: napcat_request(websocket, action, params, timeout))
+
+
+@traced("group_info")
+async def get_group_info(websocket: Server.ServerConnection, group_id: int, no_cache: bool = False) -> dict | None:
     """
     获取群相关信息
 
+    优先从缓存读取，no_cache为True时强制向Napcat请求最新数据
+    请求失败或熔断时返回缓存中的旧数据（可能已过期），没有旧数据或no_cache为True时返回None
     返回值需要处理可能为空的情况
     """
+    if not no_cache and (cached_group_info := group_info_cache.get(group_id)) is not None:
+        return cached_group_info
     logger.debug("获取群聊信息中")
-    request_uuid = str(uuid.uuid4())
-    payload = json.dumps({"action": "get_group_info", "params": {"group_id": group_id}, "echo": request_uuid})
     try:
-        await websocket.send(payload)
-        socket_response: dict = await get_response(request_uuid)
+        socket_response: dict = await coalesced_napcat_request(websocket, "get_group_info", {"group_id": group_id})
+    except NapcatCircuitOpen:
+        return None if no_cache else group_info_cache.get_stale(group_id)  # 熔断期间不逐条输出错误
     except TimeoutError:
         logger.error(f"获取群信息超时，群号: {group_id}")
-        return None
+        return None if no_cache else group_info_cache.get_stale(group_id)
     except Exception as e:
         logger.error(f"获取群信息失败: {e}")
-        return None
-    logger.debug(socket_response)
-    return socket_response.get("data")
+        return None if no_cache else group_info_cache.get_stale(group_id)
+    lazy_debug("{}", lambda: truncate(socket_response))
+    group_data: dict | None = socket_response.get("data")
+    if group_data:
+        group_info_cache.put(group_id, group_data)
+    return group_data
 
 
 async def get_group_detail_info(websocket: Server.ServerConnection, group_id: int) -> dict | None:
@@ -52,60 +173,71 @@ async def get_group_detail_info(websocket: Server.ServerConnection, group_id: in
     返回值需要处理可能为空的情况
     """
     logger.debug("获取群详细信息中")
-    request_uuid = str(uuid.uuid4())
-    payload = json.dumps({"action": "get_group_detail_info", "params": {"group_id": group_id}, "echo": request_uuid})
     try:
-        await websocket.send(payload)
-        socket_response: dict = await get_response(request_uuid)
+        socket_response: dict = await napcat_request(websocket, "get_group_detail_info", {"group_id": group_id})
     except TimeoutError:
         logger.error(f"获取群详细信息超时，群号: {group_id}")
         return None
     except Exception as e:
         logger.error(f"获取群详细信息失败: {e}")
         return None
-    logger.debug(socket_response)
+    lazy_debug("{}", lambda: truncate(socket_response))
     return socket_response.get("data")
 
 
-async def get_member_info(websocket: Server.ServerConnection, group_id: int, user_id: int) -> dict | None:
+@traced("member_info")
+async def get_member_info(
+    websocket: Server.ServerConnection, group_id: int, user_id: int, no_cache: bool = False
+) -> dict | None:
     """
     获取群成员信息
 
+    优先从缓存读取，no_cache为True时跳过本地缓存并要求Napcat从QQ后端获取最新数据
+    请求失败或熔断时返回缓存中的旧数据（可能已过期），没有旧数据或no_cache为True时返回None
     返回值需要处理可能为空的情况
     """
+    cache_key = (group_id, user_id)
+    if not no_cache and (cached_member_info := member_info_cache.get(cache_key)) is not None:
+        return cached_member_info
     logger.debug("获取群成员信息中")
-    request_uuid = str(uuid.uuid4())
-    payload = json.dumps(
-        {
-            "action": "get_group_member_info",
-            "params": {"group_id": group_id, "user_id": user_id, "no_cache": True},
-            "echo": request_uuid,
-        }
-    )
     try:
-        await websocket.send(payload)
-        socket_response: dict = await get_response(request_uuid)
+        socket_response: dict = await coalesced_napcat_request(
+            websocket, "get_group_member_info", {"group_id": group_id, "user_id": user_id, "no_cache": no_cache}
+        )
+    except NapcatCircuitOpen:
+        return None if no_cache else member_info_cache.get_stale(cache_key)  # 熔断期间不逐条输出错误
     except TimeoutError:
         logger.error(f"获取成员信息超时，群号: {group_id}, 用户ID: {user_id}")
-        return None
+        return None if no_cache else member_info_cache.get_stale(cache_key)
     except Exception as e:
         logger.error(f"获取成员信息失败: {e}")
-        return None
-    logger.debug(socket_response)
-    return socket_response.get("data")
+        return None if no_cache else member_info_cache.get_stale(cache_key)
+    lazy_debug("{}", lambda: truncate(socket_response))
+    member_data: dict | None = socket_response.get("data")
+    if member_data:
+        member_info_cache.put(cache_key, member_data)
+    return member_data
 
 
-async def get_image_base64(url: str) -> str:
-    # sourcery skip: raise-specific-error
-    """获取图片/表情包的Base64"""
+@traced("media")
+async def get_image_base64(url: str, cache_key: Optional[str] = None) -> str:
+    """
+    获取图片/表情包的Base64
+    Parameters:
+        url: str: 图片地址
+        cache_key: str: 缓存使用的key，优先使用QQ文件ID，未提供时使用url
+    Returns:
+        str: Base64编码的图片数据
+    """
+    cache_key = cache_key or url
+    if (cached_image := await media_cache.get(cache_key)) is not None:
+        return cached_image
     logger.debug(f"下载图片: {url}")
-    http = SSLAdapter()
     try:
-        response = http.request("GET", url, timeout=10)
-        if response.status != 200:
-            raise Exception(f"HTTP Error: {response.status}")
-        image_bytes = response.data
-        return base64.b64encode(image_bytes).decode("utf-8")
+        image_bytes = await media_downloader.download(url)
+        image_base64 = base64.b64encode(image_bytes).decode("utf-8")
+        await media_cache.put(cache_key, image_base64)
+        return image_base64
     except Exception as e:
         logger.error(f"图片下载失败: {str(e)}")
         raise
@@ -122,51 +254,118 @@ def convert_image_to_gif(image_base64: str) -> str:
     """
     logger.debug("转换图片为GIF格式")
     try:
-        image_bytes = base64.b64decode(image_base64)
-        image = Image.open(io.BytesIO(image_bytes))
-        output_buffer = io.BytesIO()
-        image.save(output_buffer, format="GIF")
-        output_buffer.seek(0)
-        return base64.b64encode(output_buffer.read()).decode("utf-8")
+        return _encode_gif(image_base64)
     except Exception as e:
         logger.error(f"图片转换为GIF失败: {str(e)}")
         return image_base64
 
 
-async def get_self_info(websocket: Server.ServerConnection) -> dict | None:
+def _encode_gif(image_base64: str) -> str:
+    """将Base64编码的图片转换为GIF格式，失败时抛出异常"""
+    image_bytes = base64.b64decode(image_base64)
+    image = Image.open(io.BytesIO(image_bytes))
+    output_buffer = io.BytesIO()
+    image.save(output_buffer, format="GIF")
+    output_buffer.seek(0)
+    return base64.b64encode(output_buffer.read()).decode("utf-8")
+
+
+async def get_self_info(websocket: Server.ServerConnection, refresh: bool = False) -> dict | None:
     """
     获取自身信息
+
+    自身信息按连接缓存SELF_INFO_TTL秒，自身群名片变更时也会清除缓存，refresh为True时强制重新获取
     Parameters:
         websocket: WebSocket连接对象
+        refresh: bool: 是否忽略缓存重新获取
     Returns:
         data: dict: 返回的自身信息
     """
+    if not refresh and (cached := _self_info_cache.get(websocket)) is not None and cached[0] > time.monotonic():
+        return cached[1]
     logger.debug("获取自身信息中")
-    request_uuid = str(uuid.uuid4())
-    payload = json.dumps({"action": "get_login_info", "params": {}, "echo": request_uuid})
     try:
-        await websocket.send(payload)
-        response: dict = await get_response(request_uuid)
+        response: dict = await coalesced_napcat_request(websocket, "get_login_info", {})
     except TimeoutError:
         logger.error("获取自身信息超时")
         return None
     except Exception as e:
         logger.error(f"获取自身信息失败: {e}")
         return None
-    logger.debug(response)
-    return response.get("data")
+    lazy_debug("{}", lambda: truncate(response))
+    self_data: dict | None = response.get("data")
+    if self_data:
+        _self_info_cache[websocket] = (time.monotonic() + SELF_INFO_TTL, self_data)
+    return self_data
+
+
+def invalidate_self_info(websocket: Server.ServerConnection) -> None:
+    """
+    清除连接上缓存的自身信息，用于资料变更后下次获取时重新请求
+    """
+    _self_info_cache.pop(websocket, None)
 
 
 def get_image_format(raw_data: str) -> str:
     """
     从Base64编码的数据中确定图片的格式。
+    只解码开头的少量数据并根据魔数判断，不会完整解码图片。
     Parameters:
         raw_data: str: Base64编码的图片数据。
     Returns:
-        format: str: 图片的格式（例如 'jpeg', 'png', 'gif'）。
+        format: str: 图片的格式（例如 'jpeg', 'png', 'gif'），无法识别时返回 'unknown'。
     """
-    image_bytes = base64.b64decode(raw_data)
-    return Image.open(io.BytesIO(image_bytes)).format.lower()
+    header = base64.b64decode(raw_data[:24])  # 24个Base64字符对应18字节
+    for signature, offset, image_format in IMAGE_SIGNATURES:
+        if header[offset : offset + len(signature)] == signature:
+            return image_format
+    return "unknown"
+
+
+def _get_image_executor() -> ThreadPoolExecutor:
+    global _image_executor
+    if _image_executor is None:
+        _image_executor = ThreadPoolExecutor(
+            max_workers=global_config.media.image_workers, thread_name_prefix="napcat_image"
+        )
+    return _image_executor
+
+
+async def run_image_task(func: Callable[..., Any], *args: Any) -> Any:
+    """
+    在图片处理池中执行耗时的图片操作，避免阻塞事件循环
+    Parameters:
+        func: Callable: 要执行的函数
+        *args: 函数参数
+    Returns:
+        Any: 函数返回值，超时抛出TimeoutError
+    """
+    loop = asyncio.get_running_loop()
+    return await asyncio.wait_for(
+        loop.run_in_executor(_get_image_executor(), func, *args), global_config.media.image_task_timeout
+    )
+
+
+async def convert_image_to_gif_async(image_base64: str) -> str | None:
+    """
+    在图片处理池中将图片转换为GIF格式，超时或失败时返回None，由调用方决定是否使用原图
+    """
+    try:
+        return await run_image_task(_encode_gif, image_base64)
+    except TimeoutError:
+        logger.error("图片转换为GIF超时")
+        return None
+    except Exception as e:
+        logger.error(f"图片转换为GIF失败: {str(e)}")
+        return None
+
+
+def shutdown_image_executor() -> None:
+    """关闭图片处理池"""
+    global _image_executor
+    if _image_executor is not None:
+        _image_executor.shutdown(wait=False, cancel_futures=True)
+        _image_executor = None
 
 
 async def get_stranger_info(websocket: Server.ServerConnection, user_id: int) -> dict | None:
@@ -179,21 +378,19 @@ async def get_stranger_info(websocket: Server.ServerConnection, user_id: int) ->
         dict: 返回的陌生人信息
     """
     logger.debug("获取陌生人信息中")
-    request_uuid = str(uuid.uuid4())
-    payload = json.dumps({"action": "get_stranger_info", "params": {"user_id": user_id}, "echo": request_uuid})
     try:
-        await websocket.send(payload)
-        response: dict = await get_response(request_uuid)
+        response: dict = await coalesced_napcat_request(websocket, "get_stranger_info", {"user_id": user_id})
     except TimeoutError:
         logger.error(f"获取陌生人信息超时，用户ID: {user_id}")
         return None
     except Exception as e:
         logger.error(f"获取陌生人信息失败: {e}")
         return None
-    logger.debug(response)
+    lazy_debug("{}", lambda: truncate(response))
     return response.get("data")
 
 
+@traced("message_lookup")
 async def get_message_detail(websocket: Server.ServerConnection, message_id: Union[str, int]) -> dict | None:
     """
     获取消息详情，可能为空
@@ -204,21 +401,21 @@ async def get_message_detail(websocket: Server.ServerConnection, message_id: Uni
         dict: 返回的消息详情
     """
     logger.debug("获取消息详情中")
-    request_uuid = str(uuid.uuid4())
-    payload = json.dumps({"action": "get_msg", "params": {"message_id": message_id}, "echo": request_uuid})
     try:
-        await websocket.send(payload)
-        response: dict = await get_response(request_uuid, 30)  # 增加超时时间到30秒
+        response: dict = await napcat_request(
+            websocket, "get_msg", {"message_id": message_id}, 30
+        )  # 增加超时时间到30秒
     except TimeoutError:
         logger.error(f"获取消息详情超时，消息ID: {message_id}")
         return None
     except Exception as e:
         logger.error(f"获取消息详情失败: {e}")
         return None
-    logger.debug(response)
+    lazy_debug("{}", lambda: truncate(response))
     return response.get("data")
 
 
+@traced("media")
 async def get_record_detail(
     websocket: Server.ServerConnection, file: str, file_id: Optional[str] = None
 ) -> dict | None:
@@ -232,24 +429,17 @@ async def get_record_detail(
         dict: 返回的语音消息详情
     """
     logger.debug("获取语音消息详情中")
-    request_uuid = str(uuid.uuid4())
-    payload = json.dumps(
-        {
-            "action": "get_record",
-            "params": {"file": file, "file_id": file_id, "out_format": "wav"},
-            "echo": request_uuid,
-        }
-    )
     try:
-        await websocket.send(payload)
-        response: dict = await get_response(request_uuid, 30)  # 增加超时时间到30秒
+        response: dict = await napcat_request(
+            websocket, "get_record", {"file": file, "file_id": file_id, "out_format": "wav"}, 30
+        )  # 增加超时时间到30秒
     except TimeoutError:
         logger.error(f"获取语音消息详情超时，文件: {file}, 文件ID: {file_id}")
         return None
     except Exception as e:
         logger.error(f"获取语音消息详情失败: {e}")
         return None
-    logger.debug(f"{str(response)[:200]}...")  # 防止语音的超长base64编码导致日志过长
+    lazy_debug("{}", lambda: truncate(response, 200))  # 防止语音的超长base64编码导致日志过长
     return response.get("data")
 
 
@@ -268,37 +458,51 @@ async def read_ban_list(
         ]
     """
     try:
-        ban_list = db_manager.get_ban_records()
+        ban_records = db_manager.get_ban_records()
+        ban_list: List[BanUser] = []
         lifted_list: List[BanUser] = []
         logger.info("已经读取禁言列表")
-        for ban_record in ban_list:
+        # 所有记录的查询一次性发出，而不是逐条等待响应
+        requests = [
+            ("get_group_info", {"group_id": ban_record.group_id})
+            if ban_record.user_id == 0
+            else (
+                "get_group_member_info",
+                {"group_id": ban_record.group_id, "user_id": ban_record.user_id, "no_cache": True},
+            )
+            for ban_record in ban_records
+        ]
+        results = await napcat_batch_request(websocket, requests)
+        for ban_record, result in zip(ban_records, results, strict=True):
+            if result.error is not None:
+                logger.error(f"查询禁言状态失败: {result.error}")
             if ban_record.user_id == 0:
-                fetched_group_info = await get_group_info(websocket, ban_record.group_id)
+                fetched_group_info: dict | None = result.data
                 if fetched_group_info is None:
                     logger.warning(f"无法获取群信息，群号: {ban_record.group_id}，默认禁言解除")
                     lifted_list.append(ban_record)
-                    ban_list.remove(ban_record)
                     continue
+                group_info_cache.put(ban_record.group_id, fetched_group_info)
                 group_all_shut: int = fetched_group_info.get("group_all_shut")
                 if group_all_shut == 0:
                     lifted_list.append(ban_record)
-                    ban_list.remove(ban_record)
                     continue
+                ban_list.append(ban_record)
             else:
-                fetched_member_info = await get_member_info(websocket, ban_record.group_id, ban_record.user_id)
+                fetched_member_info: dict | None = result.data
                 if fetched_member_info is None:
                     logger.warning(
                         f"无法获取群成员信息，用户ID: {ban_record.user_id}, 群号: {ban_record.group_id}，默认禁言解除"
                     )
                     lifted_list.append(ban_record)
-                    ban_list.remove(ban_record)
                     continue
+                member_info_cache.put((ban_record.group_id, ban_record.user_id), fetched_member_info)
                 lift_ban_time: int = fetched_member_info.get("shut_up_timestamp")
                 if lift_ban_time == 0:
                     lifted_list.append(ban_record)
-                    ban_list.remove(ban_record)
                 else:
                     ban_record.lift_time = lift_ban_time
+                    ban_list.append(ban_record)
         db_manager.update_ban_record(ban_list)
         return ban_list, lifted_list
     except Exception as e:
@@ -1,68 +1,240 @@
 """
 NapCat适配器客户端
-提供与现有NapcatAdapter的WebSocket连接
+优先通过NapcatAdapter持有的Napcat连接在进程内发送请求，也可单独连接到NapCat WebSocket服务器
 """
 
 import asyncio
 import json
+import random
+import uuid
+from typing import Dict, List, Optional, Sequence, Tuple
+
 import websockets
 from src.common.logger import get_logger
 
+from plugins.napcat_plugin.ada.config import global_config
+from plugins.napcat_plugin.ada.connection_supervisor import NapcatConnectionClosed, connection_supervisor, is_idempotent
+from plugins.napcat_plugin.ada.frame_router import json_loads, peek_frame
+from plugins.napcat_plugin.ada.rpc_batch import DEFAULT_BATCH_CONCURRENCY, BatchResult, run_batch
+from plugins.napcat_plugin.ada.utils import napcat_request
+
 logger = get_logger("napcat_plugin")
 
 class AdapterClient:
-    """适配器客户端，用于与NapCat WebSocket服务器通信"""
-    
-    def __init__(self, host: str = "127.0.0.1", port: int = 8000):
+    """
+    适配器客户端，用于与NapCat WebSocket服务器通信
+
+    未调用connect时，请求经由napcat_request发送到NapcatAdapter与Napcat之间的连接上，
+    与adapter共用响应池、请求统计、流量记录与断线重发，不需要额外的连接。
+
+    调用connect后单独连接：每个请求带有唯一的echo，由后台读取任务按echo把响应交给对应的请求，
+    因此多个请求可以在同一连接上并发进行，连接上的事件帧会被忽略。
+    连接意外断开时，等待中的请求立即以NapcatConnectionClosed失败，并按带随机抖动的指数退避自动重连。
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8000,
+        reconnect_initial_delay: float = 1.0,
+        reconnect_max_delay: float = 30.0,
+    ):
         self.host = host
         self.port = port
+        self.reconnect_initial_delay = reconnect_initial_delay
+        self.reconnect_max_delay = reconnect_max_delay
         self.websocket = None
         self.connected = False
-        
+        self._standalone = False
+        """是否使用connect建立的独立连接"""
+        self._connected_event = asyncio.Event()
+        self._pending: Dict[str, asyncio.Future] = {}
+        """echo -> 等待响应的Future"""
+        self._reader_task: Optional[asyncio.Task] = None
+        self._reconnect_task: Optional[asyncio.Task] = None
+        self._reconnect_waiting: int = 0
+
     async def connect(self):
-        """连接到NapCat WebSocket服务器"""
+        """连接到NapCat WebSocket服务器，之后的请求都通过该连接发送"""
+        self._standalone = True
+        if self.connected:
+            return
+        await self._open()
+
+    async def _open(self) -> None:
         try:
             uri = f"ws://{self.host}:{self.port}"
             logger.info(f"连接到NapCat服务器: {uri}")
-            self.websocket = await websockets.connect(uri)
+            self.websocket = await websockets.connect(uri, max_size=2**26)
             self.connected = True
+            self._connected_event.set()
+            self._reader_task = asyncio.create_task(self._read_loop(self.websocket))
             logger.info("成功连接到NapCat服务器")
         except Exception as e:
             logger.error(f"连接NapCat服务器失败: {e}")
             self.connected = False
             raise
-            
+
     async def disconnect(self):
-        """断开连接"""
+        """断开连接并停止自动重连，未完成的请求会收到NapcatConnectionClosed"""
+        self._standalone = False
+        if self._reconnect_task:
+            self._reconnect_task.cancel()
+            await asyncio.gather(self._reconnect_task, return_exceptions=True)
+            self._reconnect_task = None
         if self.websocket:
             await self.websocket.close()
             self.connected = False
             logger.info("已断开与NapCat服务器的连接")
-            
-    async def send_request(self, action: str, params: dict) -> dict:
-        """发送请求到NapCat服务器"""
-        if not self.connected or not self.websocket:
-            raise RuntimeError("未连接到NapCat服务器")
-            
+        if self._reader_task:
+            self._reader_task.cancel()
+            await asyncio.gather(self._reader_task, return_exceptions=True)
+            self._reader_task = None
+
+    async def _read_loop(self, websocket) -> None:
+        """读取连接上的所有帧，把响应交给对应的请求"""
+        try:
+            async for raw_message in websocket:
+                echo = peek_frame(raw_message).echo
+                if echo is None:
+                    continue  # 事件帧，客户端不处理
+                future = self._pending.pop(echo, None)
+                if future is None:
+                    logger.debug(f"响应 {echo} 已无人等待，直接丢弃")
+                    continue
+                if not future.done():
+                    future.set_result(json_loads(raw_message))
+        except websockets.ConnectionClosed as e:
+            logger.warning(f"与NapCat服务器的连接已断开: {e}")
+        except Exception as e:
+            logger.error(f"读取NapCat服务器数据失败: {e}")
+        finally:
+            if self.websocket is websocket:
+                self.connected = False
+                self._connected_event.clear()
+            self._fail_pending(NapcatConnectionClosed("与NapCat服务器的连接已断开"))
+            if self._standalone and self._reconnect_task is None:
+                self._reconnect_task = asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self) -> None:
+        """按带随机抖动的指数退避重连，直到成功或调用disconnect"""
+        delay = self.reconnect_initial_delay
+        try:
+            while self._standalone and not self.connected:
+                wait = random.uniform(0, delay)
+                logger.info(f"{wait:.1f} 秒后尝试重新连接NapCat服务器")
+                await asyncio.sleep(wait)
+                try:
+                    await self._open()
+                except Exception:
+                    delay = min(delay * 2, self.reconnect_max_delay)
+        finally:
+            self._reconnect_task = None
+
+    def _fail_pending(self, error: Exception) -> None:
+        pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(error)
+
+    async def _wait_reconnected(self) -> None:
+        """断线期间的只读请求等待重连，等待时间与数量的上限与adapter的断线重发相同"""
+        timeout = global_config.napcat_server.replay_timeout
+        if timeout <= 0 or self._reconnect_waiting >= global_config.napcat_server.replay_queue_size:
+            raise NapcatConnectionClosed("与NapCat服务器的连接已断开")
+        self._reconnect_waiting += 1
+        try:
+            await asyncio.wait_for(self._connected_event.wait(), timeout)
+        except TimeoutError:
+            raise NapcatConnectionClosed(f"与NapCat服务器的连接在 {timeout} 秒内未恢复") from None
+        finally:
+            self._reconnect_waiting -= 1
+
+    async def send_request(self, action: str, params: dict, timeout: float = 10) -> dict:
+        """
+        发送请求到NapCat服务器并等待其响应
+        Parameters:
+            action: 请求的动作
+            params: 请求参数
+            timeout: 等待响应的超时时间（秒），超时抛出TimeoutError
+        Returns:
+            dict: NapCat返回的完整响应
+        Raises:
+            NapcatConnectionClosed: 连接已断开且未能在限定时间内恢复，只读请求会先等待恢复
+        """
+        if not self._standalone:
+            connection = connection_supervisor.connection
+            if connection is None:
+                if not is_idempotent(action):
+                    raise NapcatConnectionClosed("adapter当前未与Napcat连接")
+                connection = await connection_supervisor.wait_for_connection()
+            return await napcat_request(connection, action, params, timeout)
+
+        if not self.connected:
+            if not is_idempotent(action):
+                raise NapcatConnectionClosed("未连接到NapCat服务器")
+            await self._wait_reconnected()
+
+        try:
+            return await self._send_standalone(action, params, timeout)
+        except NapcatConnectionClosed:
+            if not is_idempotent(action):
+                raise
+            await self._wait_reconnected()
+            logger.info(f"与NapCat服务器的连接已恢复，重新发送请求 {action}")
+            return await self._send_standalone(action, params, timeout)
+
+    async def send_batch(
+        self,
+        requests: Sequence[Tuple[str, dict]],
+        concurrency: int = DEFAULT_BATCH_CONCURRENCY,
+        timeout: float = 10,
+    ) -> List[BatchResult]:
+        """
+        批量发送请求，请求连续写入连接后并发等待响应
+        Parameters:
+            requests: (action, params) 列表
+            concurrency: 同时等待响应的请求数上限
+            timeout: 单个请求的超时时间（秒）
+        Returns:
+            List[BatchResult]: 与requests顺序一致的结果，单个请求的异常保存在对应结果中
+        """
+        return await run_batch(
+            requests, lambda action, params: self.send_request(action, params, timeout), concurrency
+        )
+
+    async def _send_standalone(self, action: str, params: dict, timeout: float) -> dict:
+        echo = str(uuid.uuid4())
         request = {
             "action": action,
-            "params": params
+            "params": params,
+            "echo": echo,
         }
-        
+        # 先登记再发送，避免响应先于登记到达
+        future = asyncio.get_running_loop().create_future()
+        self._pending[echo] = future
+
         try:
-            await self.websocket.send(json.dumps(request))
-            response = await self.websocket.recv()
-            return json.loads(response)
+            try:
+                await self.websocket.send(json.dumps(request))
+            except websockets.ConnectionClosed as e:
+                raise NapcatConnectionClosed(f"与NapCat服务器的连接已断开: {e}") from e
+            return await asyncio.wait_for(future, timeout)
+        except TimeoutError:
+            logger.error(f"请求 {action} 超时，未收到响应")
+            raise
         except Exception as e:
             logger.error(f"发送请求失败: {e}")
             raise
-            
+        finally:
+            self._pending.pop(echo, None)
+
     async def __aenter__(self):
         await self.connect()
         return self
-        
+
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         await self.disconnect()
 
 # 全局适配器客户端实例
-adapter_client = AdapterClient()
\ No newline at end of file
+adapter_client = AdapterClient()
@@ -0,0 +1,6 @@
+"""
+开发与性能测试工具
+
+这些脚本不会被插件加载，需要在MaiBot根目录下以模块方式运行，例如：
+python -m plugins.napcat_plugin.devtools.bench_response_pool
+"""
@@ -0,0 +1,149 @@
+"""
+接收路径预解码路由基准测试
+
+对比"每帧完整json.loads"与"先peek_frame路由、仅在需要时完整解码"两种方式的耗时。
+
+语料为每行一帧原始数据的文本文件（可为.gz压缩），例如从Napcat日志中导出的帧；
+也可以直接使用流量记录文件（见 devtools.replay），只取其中Napcat发来的数据。
+未指定语料时会生成一份模拟语料，包含心跳、白名单内外的群消息、大体积的转发与语音响应等。
+
+运行方式（MaiBot根目录）：
+python -m plugins.napcat_plugin.devtools.bench_frame_router --corpus frames.jsonl.gz --allowed-groups 123456
+"""
+
+import argparse
+import base64
+import gzip
+import json
+import os
+import random
+import time
+import uuid
+from typing import List, Set
+
+from plugins.napcat_plugin.ada.frame_router import json_loads, orjson, peek_frame
+
+
+def load_corpus(path: str) -> List[str]:
+    opener = gzip.open if path.endswith(".gz") else open
+    frames: List[str] = []
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('{"t":'):
+                record = json.loads(line)
+                if record.get("dir") == "in":
+                    frames.append(record["frame"])
+            else:
+                frames.append(line)
+    return frames
+
+
+def synthesize_corpus(count: int, allowed_groups: Set[int], pending_echoes: Set[str]) -> List[str]:
+    """生成模拟语料"""
+    rng = random.Random(0)
+    blocked_groups = [900000 + i for i in range(20)]
+    frames: List[str] = []
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.05:
+            frames.append(
+                json.dumps(
+                    {
+                        "time": int(time.time()),
+                        "self_id": 10000,
+                        "post_type": "meta_event",
+                        "meta_event_type": "heartbeat",
+                        "status": {"online": True, "good": True},
+                        "interval": 30000,
+                    }
+                )
+            )
+        elif roll < 0.75:
+            group_id = rng.choice(list(allowed_groups)) if rng.random() < 0.3 else rng.choice(blocked_groups)
+            text = "".join(rng.choice("今天天气不错啊哈哈哈") for _ in range(rng.randint(5, 200)))
+            frames.append(
+                json.dumps(
+                    {
+                        "self_id": 10000,
+                        "user_id": rng.randint(10000, 99999),
+                        "time": int(time.time()),
+                        "message_id": rng.randint(1, 2**31),
+                        "message_type": "group",
+                        "sender": {"user_id": 1, "nickname": "QQ用户", "card": "", "role": "member"},
+                        "raw_message": text,
+                        "font": 14,
+                        "sub_type": "normal",
+                        "message": [{"type": "text", "data": {"text": text}}],
+                        "message_format": "array",
+                        "post_type": "message",
+                        "group_id": group_id,
+                    },
+                    ensure_ascii=False,
+                )
+            )
+        else:
+            # 大体积响应：语音base64或转发消息，其中约一半的请求方已超时
+            echo = str(uuid.uuid4())
+            if rng.random() < 0.5:
+                pending_echoes.add(echo)
+            payload = base64.b64encode(os.urandom(rng.randint(20_000, 400_000))).decode()
+            frames.append(
+                json.dumps({"status": "ok", "retcode": 0, "data": {"base64": payload}, "message": "", "echo": echo})
+            )
+    return frames
+
+
+def bench_full_decode(frames: List[str]) -> float:
+    start = time.perf_counter()
+    for frame in frames:
+        json.loads(frame)
+    return time.perf_counter() - start
+
+
+def bench_router(frames: List[str], allowed_groups: Set[int], pending_echoes: Set[str]) -> tuple[float, int]:
+    skipped = 0
+    start = time.perf_counter()
+    for frame in frames:
+        peek = peek_frame(frame)
+        if peek.echo is not None and peek.echo not in pending_echoes:
+            skipped += 1
+            continue
+        if peek.group_id is not None and peek.group_id not in allowed_groups:
+            skipped += 1
+            continue
+        json_loads(frame)
+    return time.perf_counter() - start, skipped
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="接收路径预解码路由基准测试")
+    parser.add_argument("--corpus", help="语料文件路径，每行一帧，支持.gz；不指定则生成模拟语料")
+    parser.add_argument("--frames", type=int, default=5000, help="模拟语料的帧数")
+    parser.add_argument("--allowed-groups", type=int, nargs="*", default=[1001, 1002, 1003], help="白名单中的群号")
+    args = parser.parse_args()
+
+    allowed_groups = set(args.allowed_groups)
+    pending_echoes: Set[str] = set()
+    if args.corpus:
+        frames = load_corpus(args.corpus)
+        # 录制语料中无法得知哪些请求仍在等待，视为全部在等待
+        pending_echoes = {peek.echo for peek in map(peek_frame, frames) if peek.echo is not None}
+    else:
+        frames = synthesize_corpus(args.frames, allowed_groups, pending_echoes)
+
+    total_bytes = sum(len(frame) for frame in frames)
+    full_time = bench_full_decode(frames)
+    router_time, skipped = bench_router(frames, allowed_groups, pending_echoes)
+    print(f"语料: {len(frames)} 帧, {total_bytes / 1024 / 1024:.1f} MiB, orjson: {'已启用' if orjson else '未安装'}")
+    print(f"完整解码: {full_time * 1000:8.1f}ms  ({full_time / len(frames) * 1e6:7.1f}us/帧)")
+    print(
+        f"预解码路由: {router_time * 1000:8.1f}ms  ({router_time / len(frames) * 1e6:7.1f}us/帧)，"
+        f"跳过完整解码 {skipped} 帧"
+    )
+
+
+if __name__ == "__main__":
+    main()
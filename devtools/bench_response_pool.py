@@ -0,0 +1,109 @@
+"""
+响应池微基准测试
+
+对比旧版轮询实现（每0.2秒检查一次响应字典）与基于Future的实现，
+模拟NapCat在随机延迟后返回响应，统计请求方拿到响应的p50/p99延迟。
+
+运行方式（MaiBot根目录）：
+python -m plugins.napcat_plugin.devtools.bench_response_pool --requests 2000 --concurrency 200
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List
+
+from plugins.napcat_plugin.ada import response_pool
+
+
+class LegacyPollingPool:
+    """旧版响应池实现，仅用于对比"""
+
+    def __init__(self):
+        self.response_dict: Dict[str, dict] = {}
+
+    async def get_response(self, request_id: str, timeout: int = 10) -> dict:
+        async def _get_response() -> dict:
+            while request_id not in self.response_dict:
+                await asyncio.sleep(0.2)
+            return self.response_dict.pop(request_id)
+
+        return await asyncio.wait_for(_get_response(), timeout)
+
+    async def put_response(self, response: dict) -> None:
+        self.response_dict[response.get("echo")] = response
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def run_case(
+    get_response: Callable[[str], Awaitable[dict]],
+    put_response: Callable[[dict], Awaitable[None]],
+    total: int,
+    concurrency: int,
+    min_latency: float,
+    max_latency: float,
+) -> List[float]:
+    """返回每个请求从发出到拿到响应的耗时（毫秒）"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    async def fake_napcat(echo: str) -> None:
+        await asyncio.sleep(random.uniform(min_latency, max_latency))
+        await put_response({"status": "ok", "retcode": 0, "data": {}, "echo": echo})
+
+    async def one_request() -> None:
+        async with semaphore:
+            echo = str(uuid.uuid4())
+            start = time.perf_counter()
+            asyncio.create_task(fake_napcat(echo))
+            await get_response(echo)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(one_request() for _ in range(total)))
+    return latencies
+
+
+def report(name: str, latencies: List[float], napcat_latency_ms: float) -> None:
+    print(
+        f"{name:<8} n={len(latencies):<6} "
+        f"p50={percentile(latencies, 50):8.2f}ms  "
+        f"p99={percentile(latencies, 99):8.2f}ms  "
+        f"mean={statistics.fmean(latencies):8.2f}ms  "
+        f"(NapCat模拟平均延迟 {napcat_latency_ms:.2f}ms)"
+    )
+
+
+async def main(args: argparse.Namespace) -> None:
+    legacy = LegacyPollingPool()
+    napcat_latency_ms = (args.min_latency + args.max_latency) / 2 * 1000
+
+    before = await run_case(
+        legacy.get_response, legacy.put_response, args.requests, args.concurrency, args.min_latency, args.max_latency
+    )
+    after = await run_case(
+        response_pool.get_response,
+        response_pool.put_response,
+        args.requests,
+        args.concurrency,
+        args.min_latency,
+        args.max_latency,
+    )
+    report("polling", before, napcat_latency_ms)
+    report("future", after, napcat_latency_ms)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="响应池微基准测试")
+    parser.add_argument("--requests", type=int, default=2000, help="请求总数")
+    parser.add_argument("--concurrency", type=int, default=200, help="同时在途的请求数")
+    parser.add_argument("--min-latency", type=float, default=0.001, help="模拟NapCat最小响应延迟（秒）")
+    parser.add_argument("--max-latency", type=float, default=0.02, help="模拟NapCat最大响应延迟（秒）")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,282 @@
+"""
+端到端压测
+
+在同一进程内启动 模拟MaiBot服务端 -> adapter -> 模拟Napcat，
+按设定速率发送事件，统计吞吐量、端到端延迟分位数（Napcat发出事件到MaiBot收到消息）、
+回复往返延迟（Napcat发出事件到收到adapter的发送消息请求）以及内存占用随时间的变化。
+
+模拟MaiBot服务端会监听配置文件中maibot_server的地址，请确保该端口未被真实的MaiBot占用；
+群聊/私聊白名单模式下默认使用配置中的群号与QQ号。进程内启动adapter时，模拟的群号与QQ号会被临时加入
+聊天白名单（或移出黑名单），只修改内存中的配置；使用--external时需自行确保这些群号与QQ号不会被过滤。
+
+运行方式（MaiBot根目录）：
+python -m plugins.napcat_plugin.devtools.load_test --rate 200 --duration 60
+"""
+
+import argparse
+import asyncio
+import os
+import resource
+import time
+import tracemalloc
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from plugins.napcat_plugin.ada.config import global_config
+from plugins.napcat_plugin.ada.rpc_metrics import format_ms, rpc_metrics
+from plugins.napcat_plugin.ada.tracing import trace_metrics
+from plugins.napcat_plugin.devtools.bench_response_pool import percentile
+from plugins.napcat_plugin.devtools.maibot_stub import MaiBotStub
+from plugins.napcat_plugin.devtools.napcat_simulator import NapcatSimulator, SimulatorConfig, parse_mix
+
+
+def current_rss_bytes() -> int:
+    """当前进程的常驻内存，无法读取时返回历史峰值"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # macOS上ru_maxrss单位为字节，Linux上为KB，走到这里的一般是非Linux系统
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class LoadTestRecorder:
+    """记录每个压测序号的发出、到达与回复时间"""
+
+    def __init__(self):
+        self.emit_times: Dict[int, float] = {}
+        self.emit_kinds: Dict[int, str] = {}
+        self.delivered: Counter[str] = Counter()
+        self.latencies: List[float] = []
+        self.reply_latencies: List[float] = []
+        self._window: List[float] = []
+
+    def on_emit(self, seq: int, kind: str) -> None:
+        self.emit_times[seq] = time.perf_counter()
+        self.emit_kinds[seq] = kind
+
+    def on_deliver(self, seq: int) -> None:
+        if (emitted_at := self.emit_times.get(seq)) is None:
+            return
+        latency = (time.perf_counter() - emitted_at) * 1000
+        self.latencies.append(latency)
+        self._window.append(latency)
+        self.delivered[self.emit_kinds[seq]] += 1
+
+    def on_reply(self, seq: int, action: str) -> None:
+        if (emitted_at := self.emit_times.get(seq)) is not None:
+            self.reply_latencies.append((time.perf_counter() - emitted_at) * 1000)
+
+    def take_window(self) -> List[float]:
+        window, self._window = self._window, []
+        return window
+
+
+def format_percentiles(samples: List[float]) -> str:
+    if not samples:
+        return "无数据"
+    return (
+        f"p50 {percentile(samples, 50):7.1f}ms  p90 {percentile(samples, 90):7.1f}ms  "
+        f"p99 {percentile(samples, 99):7.1f}ms  max {max(samples):7.1f}ms"
+    )
+
+
+async def report_loop(
+    recorder: LoadTestRecorder,
+    simulator: NapcatSimulator,
+    interval: float,
+    adapter=None,
+    timeline: Optional[List[Tuple[float, int, Optional[int]]]] = None,
+) -> None:
+    """定期输出吞吐量、窗口内延迟与内存占用"""
+    start = time.perf_counter()
+    last_delivered = 0
+    print(
+        f"{'时间':>6} {'已发出':>8} {'已到达':>8} {'吞吐/s':>8} {'p50':>8} {'p99':>8} {'RSS':>9} {'堆内存':>9} {'积压':>6}"
+    )
+    while True:
+        await asyncio.sleep(interval)
+        elapsed = time.perf_counter() - start
+        delivered = len(recorder.latencies)
+        window = recorder.take_window()
+        rss = current_rss_bytes()
+        traced = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+        backlog = sum(adapter.queue_depths().values()) if adapter is not None else None
+        if timeline is not None:
+            timeline.append((elapsed, rss, traced))
+        print(
+            f"{elapsed:6.0f} {sum(simulator.emitted.values()):8d} {delivered:8d} "
+            f"{(delivered - last_delivered) / interval:8.1f} "
+            f"{percentile(window, 50) if window else 0:6.1f}ms {percentile(window, 99) if window else 0:6.1f}ms "
+            f"{rss / 1024 / 1024:7.1f}MB "
+            f"{f'{traced / 1024 / 1024:7.1f}MB' if traced is not None else '-':>9} "
+            f"{backlog if backlog is not None else '-':>6}"
+        )
+        last_delivered = delivered
+
+
+async def wait_for_port(host: str, port: int, timeout: float = 30) -> None:
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            return
+        except OSError:
+            if time.perf_counter() > deadline:
+                raise
+            await asyncio.sleep(0.2)
+
+
+def default_group_ids() -> List[int]:
+    if global_config.chat.group_list_type == "whitelist" and global_config.chat.group_list:
+        return list(global_config.chat.group_list)
+    return [1001, 1002, 1003]
+
+
+def default_user_ids() -> List[int]:
+    banned = set(global_config.chat.ban_user_id)
+    if global_config.chat.private_list_type == "whitelist" and global_config.chat.private_list:
+        return [user_id for user_id in global_config.chat.private_list if user_id not in banned]
+    return [user_id for user_id in range(20001, 20051) if user_id not in banned]
+
+
+def allow_simulated_chats(group_ids: List[int], user_ids: List[int]) -> None:
+    """放行模拟的群聊与私聊，只修改内存中的配置，不写回配置文件"""
+    from plugins.napcat_plugin.ada.recv_handler.message_handler import message_handler
+
+    chat = global_config.chat
+    if chat.group_list_type == "whitelist":
+        chat.group_list = sorted(set(chat.group_list) | set(group_ids))
+    else:
+        chat.group_list = [group_id for group_id in chat.group_list if group_id not in group_ids]
+    if chat.private_list_type == "whitelist":
+        chat.private_list = sorted(set(chat.private_list) | set(user_ids))
+    else:
+        chat.private_list = [user_id for user_id in chat.private_list if user_id not in user_ids]
+    chat.ban_user_id = [user_id for user_id in chat.ban_user_id if user_id not in user_ids]
+    # message_handler在创建时复制了名单
+    message_handler.group_list = frozenset(chat.group_list)
+    message_handler.private_list = frozenset(chat.private_list)
+    message_handler.ban_user_id = frozenset(chat.ban_user_id)
+
+
+def print_summary(
+    recorder: LoadTestRecorder,
+    simulator: NapcatSimulator,
+    stub: MaiBotStub,
+    duration: float,
+    timeline: List[Tuple[float, int, Optional[int]]],
+) -> None:
+    emitted_marked = Counter(recorder.emit_kinds.values())
+    print("\n===== 压测结果 =====")
+    print(f"发出事件: {dict(simulator.emitted)}")
+    for kind, count in emitted_marked.items():
+        delivered = recorder.delivered[kind]
+        print(f"  {kind:<8} 发出 {count:6d}  到达MaiBot {delivered:6d}  ({delivered / count:6.1%})")
+    if recorder.emit_times and not recorder.latencies:
+        print("警告: 没有任何事件到达MaiBot，请检查聊天黑白名单、--groups/--users 以及adapter与MaiBot的连接")
+    print(f"吞吐量: {len(recorder.latencies) / duration:.1f} 条/秒")
+    print(f"端到端延迟: {format_percentiles(recorder.latencies)}")
+    print(f"回复往返延迟: {format_percentiles(recorder.reply_latencies)}（发出回复 {stub.replies_sent} 条）")
+    print(f"adapter发起的请求: {dict(simulator.actions)}")
+    for action, stats in rpc_metrics.snapshot().items():
+        # 仅在进程内启动adapter时有数据
+        print(
+            f"  {action:<22} {stats['requests']:6d}次  p50 {format_ms(stats['p50_ms']):>9}  "
+            f"p99 {format_ms(stats['p99_ms']):>9}  超时 {stats['timeout']}  断线 {stats['disconnected']}  失败 {stats['failed'] + stats['error']}"
+        )
+    stages = trace_metrics.snapshot()
+    if stages:
+        print("处理阶段耗时（message.* 为入站消息，send.* 为回复）:")
+        for stage, stats in stages.items():
+            print(
+                f"  {stage:<28} {stats['requests']:6d}次  p50 {format_ms(stats['p50_ms']):>9}  "
+                f"p99 {format_ms(stats['p99_ms']):>9}"
+            )
+    print(f"MaiBot收到的消息段类型: {dict(stub.received)}")
+    if timeline:
+        peak_rss = max(rss for _, rss, _ in timeline)
+        print(
+            f"内存: 起始 {timeline[0][1] / 1024 / 1024:.1f}MB  结束 {timeline[-1][1] / 1024 / 1024:.1f}MB  "
+            f"峰值 {peak_rss / 1024 / 1024:.1f}MB"
+        )
+
+
+async def run_load_test(args: argparse.Namespace) -> None:
+    recorder = LoadTestRecorder()
+    group_ids = args.groups or default_group_ids()
+    user_ids = args.users or default_user_ids()
+    simulator = NapcatSimulator(
+        SimulatorConfig(
+            rate=args.rate,
+            mix=parse_mix(args.mix) if args.mix else SimulatorConfig().mix,
+            min_latency=args.min_latency / 1000,
+            max_latency=args.max_latency / 1000,
+            group_ids=group_ids,
+            user_ids=user_ids,
+        ),
+        on_emit=recorder.on_emit,
+        on_reply=recorder.on_reply,
+    )
+    stub = MaiBotStub(
+        global_config.maibot_server.host,
+        global_config.maibot_server.port,
+        reply_ratio=args.reply_ratio,
+        on_deliver=recorder.on_deliver,
+    )
+    background: List[asyncio.Task] = [asyncio.create_task(stub.run())]
+    await wait_for_port(global_config.maibot_server.host, global_config.maibot_server.port)
+
+    adapter = None
+    if not args.external:
+        # plugin.py依赖MaiBot的插件系统，只在需要进程内启动adapter时导入
+        from plugins.napcat_plugin.plugin import NapcatAdapter
+
+        allow_simulated_chats(group_ids, user_ids)
+        adapter = NapcatAdapter(host=args.adapter_host, port=args.adapter_port)
+        background.append(asyncio.create_task(adapter.main()))
+    await wait_for_port(args.adapter_host, args.adapter_port)
+    await asyncio.sleep(args.warmup)  # 等待adapter连上模拟MaiBot
+
+    timeline: List[Tuple[float, int, Optional[int]]] = []
+    background.append(asyncio.create_task(report_loop(recorder, simulator, args.report_interval, adapter, timeline)))
+    try:
+        await simulator.run(f"ws://{args.adapter_host}:{args.adapter_port}", args.duration, args.drain)
+    finally:
+        if adapter is not None:
+            # 与插件卸载时相同的关闭流程，会一并取消压测的后台任务
+            await adapter.graceful_shutdown()
+        for task in background:
+            task.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
+        await stub.stop()
+    print_summary(recorder, simulator, stub, args.duration, timeline)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="adapter端到端压测")
+    parser.add_argument("--rate", type=float, default=50, help="每秒发送的事件数")
+    parser.add_argument("--duration", type=float, default=30, help="发送事件的时长（秒）")
+    parser.add_argument("--mix", help="事件比例，如 group=60,private=10,forward=10,reply=10,poke=5,ban=5")
+    parser.add_argument("--min-latency", type=float, default=5, help="模拟Napcat应答请求的最小延迟（毫秒）")
+    parser.add_argument("--max-latency", type=float, default=50, help="模拟Napcat应答请求的最大延迟（毫秒）")
+    parser.add_argument("--groups", type=int, nargs="*", help="发送事件的群号，默认取白名单")
+    parser.add_argument("--users", type=int, nargs="*", help="发送事件的QQ号，默认取私聊白名单")
+    parser.add_argument("--reply-ratio", type=float, default=0.2, help="模拟MaiBot回复消息的比例")
+    parser.add_argument("--adapter-host", default="127.0.0.1", help="adapter监听的地址")
+    parser.add_argument("--adapter-port", type=int, default=global_config.napcat_server.port, help="adapter监听的端口")
+    parser.add_argument("--external", action="store_true", help="不在进程内启动adapter，连接已运行的adapter")
+    parser.add_argument("--warmup", type=float, default=2, help="开始发送前的等待时间（秒）")
+    parser.add_argument("--drain", type=float, default=5, help="发送结束后等待处理完成的时间（秒）")
+    parser.add_argument("--report-interval", type=float, default=5, help="输出统计的间隔（秒）")
+    parser.add_argument("--tracemalloc", action="store_true", help="同时统计Python堆内存（有额外开销）")
+    args = parser.parse_args()
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    asyncio.run(run_load_test(args))
+
+
+if __name__ == "__main__":
+    main()
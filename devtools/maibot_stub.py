@@ -0,0 +1,78 @@
+"""
+模拟的MaiBot服务端
+
+使用maim_message的MessageServer监听adapter配置中的MaiBot地址，
+接收adapter转发的消息并统计到达情况，可按比例对带有压测标记的消息发出回复，
+以覆盖adapter从MaiBot到Napcat的发送路径。
+"""
+
+import asyncio
+import json
+import random
+from collections import Counter
+from typing import Any, Callable, Dict, Optional, Set
+
+from maim_message import MessageBase, MessageServer, Seg
+
+from plugins.napcat_plugin.devtools.napcat_simulator import find_marker, make_marker
+
+
+class MaiBotStub:
+    """
+    on_deliver(seq) 在收到带有压测标记的消息时调用，每个序号只调用一次
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        reply_ratio: float = 0.2,
+        on_deliver: Optional[Callable[[int], None]] = None,
+    ):
+        self.server = MessageServer(host=host, port=port)
+        self.server.register_message_handler(self.handle_message)
+        self.reply_ratio = reply_ratio
+        self.on_deliver = on_deliver
+        self.received: Counter[str] = Counter()
+        """按消息段类型统计的收到消息数"""
+        self.replies_sent: int = 0
+        self._delivered: Set[int] = set()
+        self._rng = random.Random(0)
+        self._reply_tasks: Set[asyncio.Task] = set()
+
+    async def handle_message(self, message: Dict[str, Any]) -> None:
+        segment = message.get("message_segment") or {}
+        segment_type = segment.get("type")
+        self.received[segment_type] += 1
+        if segment_type == "notify":
+            return  # 消息ID回送与通知，不含压测标记
+        # 转发消息会展开成多段文本，取第一个标记即可
+        seq = find_marker(json.dumps(segment, ensure_ascii=False))
+        if seq is None or seq in self._delivered:
+            return
+        self._delivered.add(seq)
+        if self.on_deliver:
+            self.on_deliver(seq)
+        if self._rng.random() < self.reply_ratio:
+            task = asyncio.create_task(self._reply(message, seq))
+            self._reply_tasks.add(task)
+            task.add_done_callback(self._reply_tasks.discard)
+
+    async def _reply(self, message: Dict[str, Any], seq: int) -> None:
+        message_info = dict(message["message_info"])
+        message_info["message_id"] = f"stub-{seq}"
+        reply = MessageBase.from_dict(
+            {
+                "message_info": message_info,
+                "message_segment": Seg(type="text", data=f"收到 {make_marker(seq)}").to_dict(),
+                "raw_message": None,
+            }
+        )
+        await self.server.send_message(reply)
+        self.replies_sent += 1
+
+    async def run(self) -> None:
+        await self.server.run()
+
+    async def stop(self) -> None:
+        await self.server.stop()
@@ -0,0 +1,344 @@
+"""
+本地Napcat模拟器
+
+作为OneBot 11反向WebSocket客户端连接到adapter（NapcatAdapter.napcat_server），
+按设定速率与比例发送群聊、私聊、转发、回复、戳一戳、禁言等事件，
+并在可配置的延迟后应答adapter发起的 get_group_info/get_group_member_info/get_msg/send_group_msg 等请求。
+
+消息文本中带有 "#lt:<序号>" 标记，供压测脚本在MaiBot一侧与回复一侧计算端到端延迟，
+使用方式见 devtools.load_test。
+"""
+
+import asyncio
+import json
+import random
+import re
+import time
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+import websockets
+
+MARKER_PATTERN = re.compile(r"#lt:(\d+)")
+"""消息中的压测序号标记"""
+
+EVENT_KINDS = ("group", "private", "forward", "reply", "poke", "ban")
+
+DEFAULT_MIX: Dict[str, float] = {"group": 60, "private": 10, "forward": 10, "reply": 10, "poke": 5, "ban": 5}
+
+
+def make_marker(seq: int) -> str:
+    return f"#lt:{seq}"
+
+
+def find_marker(text: str) -> Optional[int]:
+    """
+    从文本中读取压测序号，没有则返回None
+
+    回复消息中被引用的内容排在前面，因此取最后一个标记
+    """
+    markers = MARKER_PATTERN.findall(text)
+    return int(markers[-1]) if markers else None
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    """解析 "group=60,private=10" 形式的事件比例"""
+    mix: Dict[str, float] = {}
+    for item in text.split(","):
+        kind, _, weight = item.partition("=")
+        kind = kind.strip()
+        if kind not in EVENT_KINDS:
+            raise ValueError(f"未知的事件类型: {kind}，可选: {', '.join(EVENT_KINDS)}")
+        mix[kind] = float(weight)
+    return mix
+
+
+@dataclass
+class SimulatorConfig:
+    rate: float = 50.0
+    """每秒发送的事件数"""
+
+    mix: Dict[str, float] = field(default_factory=lambda: dict(DEFAULT_MIX))
+    """各类事件的权重"""
+
+    min_latency: float = 0.005
+    """应答请求的最小延迟，单位为秒"""
+
+    max_latency: float = 0.05
+    """应答请求的最大延迟，单位为秒"""
+
+    self_id: int = 10000
+    """模拟的机器人QQ号"""
+
+    group_ids: List[int] = field(default_factory=lambda: [1001, 1002, 1003])
+    """发送事件的群号"""
+
+    user_ids: List[int] = field(default_factory=lambda: list(range(20001, 20051)))
+    """发送事件的用户QQ号"""
+
+    forward_nodes: int = 5
+    """每条转发消息包含的节点数"""
+
+    heartbeat_interval: float = 30.0
+    """心跳间隔，单位为秒"""
+
+
+class NapcatSimulator:
+    """
+    模拟的Napcat客户端
+
+    on_emit(seq, kind) 在每个带标记的事件发出时调用，
+    on_reply(seq, action) 在收到引用了标记的发送消息请求时调用。
+    """
+
+    RECENT_MESSAGE_LIMIT = 2048
+    """为get_msg与get_forward_msg保留的最近消息数"""
+
+    def __init__(
+        self,
+        config: SimulatorConfig,
+        on_emit: Optional[Callable[[int, str], None]] = None,
+        on_reply: Optional[Callable[[int, str], None]] = None,
+    ):
+        self.config = config
+        self.on_emit = on_emit
+        self.on_reply = on_reply
+        self.emitted: Counter[str] = Counter()
+        self.actions: Counter[str] = Counter()
+        self._rng = random.Random(0)
+        self._seq = 0
+        self._message_id = 100000
+        self._recent_messages: OrderedDict[int, dict] = OrderedDict()
+        self._forward_contents: OrderedDict[str, List[dict]] = OrderedDict()
+        self._pending_actions: set[asyncio.Task] = set()
+
+    # ---------------- 事件构造 ----------------
+
+    def _next_seq(self) -> int:
+        self._seq += 1
+        return self._seq
+
+    def _next_message_id(self) -> int:
+        self._message_id += 1
+        return self._message_id
+
+    def _sender(self, user_id: int) -> dict:
+        return {"user_id": user_id, "nickname": f"用户{user_id}", "card": "", "role": "member"}
+
+    def _message_event(self, message_type: str, user_id: int, segments: List[dict], group_id: int = None) -> dict:
+        message_id = self._next_message_id()
+        event = {
+            "self_id": self.config.self_id,
+            "user_id": user_id,
+            "time": int(time.time()),
+            "message_id": message_id,
+            "message_seq": message_id,
+            "real_id": message_id,
+            "message_type": message_type,
+            "sender": self._sender(user_id),
+            "raw_message": "".join(seg["data"].get("text", "") for seg in segments),
+            "font": 14,
+            "sub_type": "normal" if message_type == "group" else "friend",
+            "message": segments,
+            "message_format": "array",
+            "post_type": "message",
+        }
+        if group_id is not None:
+            event["group_id"] = group_id
+        self._recent_messages[message_id] = event
+        while len(self._recent_messages) > self.RECENT_MESSAGE_LIMIT:
+            self._recent_messages.popitem(last=False)
+        return event
+
+    def _text(self, seq: int) -> dict:
+        return {"type": "text", "data": {"text": f"压测消息 {make_marker(seq)}"}}
+
+    def build_event(self, kind: str) -> tuple[dict, Optional[int]]:
+        """构造一个事件，返回事件与其压测序号（通知事件没有序号）"""
+        group_id = self._rng.choice(self.config.group_ids)
+        user_id = self._rng.choice(self.config.user_ids)
+        if kind == "group":
+            seq = self._next_seq()
+            return self._message_event("group", user_id, [self._text(seq)], group_id), seq
+        if kind == "private":
+            seq = self._next_seq()
+            return self._message_event("private", user_id, [self._text(seq)]), seq
+        if kind == "forward":
+            seq = self._next_seq()
+            forward_id = f"fwd{seq}"
+            self._forward_contents[forward_id] = [
+                {
+                    "sender": self._sender(self._rng.choice(self.config.user_ids)),
+                    "message": [self._text(seq)],
+                }
+                for _ in range(self.config.forward_nodes)
+            ]
+            while len(self._forward_contents) > self.RECENT_MESSAGE_LIMIT:
+                self._forward_contents.popitem(last=False)
+            segments = [{"type": "forward", "data": {"id": forward_id}}]
+            return self._message_event("group", user_id, segments, group_id), seq
+        if kind == "reply":
+            seq = self._next_seq()
+            segments = [self._text(seq)]
+            if self._recent_messages:
+                replied_id = next(reversed(self._recent_messages))
+                segments.insert(0, {"type": "reply", "data": {"id": str(replied_id)}})
+            return self._message_event("group", user_id, segments, group_id), seq
+        if kind == "poke":
+            target_id = self.config.self_id if self._rng.random() < 0.5 else self._rng.choice(self.config.user_ids)
+            return {
+                "time": int(time.time()),
+                "self_id": self.config.self_id,
+                "post_type": "notice",
+                "notice_type": "notify",
+                "sub_type": "poke",
+                "group_id": group_id,
+                "user_id": user_id,
+                "target_id": target_id,
+                "raw_info": [
+                    {"type": "qq", "uid": str(user_id)},
+                    {"type": "nor", "txt": ""},
+                    {"type": "nor", "txt": "戳了戳"},
+                    {"type": "qq", "uid": str(target_id)},
+                    {"type": "nor", "txt": ""},
+                ],
+            }, None
+        if kind == "ban":
+            banned = self._rng.random() < 0.5
+            return {
+                "time": int(time.time()),
+                "self_id": self.config.self_id,
+                "post_type": "notice",
+                "notice_type": "group_ban",
+                "sub_type": "ban" if banned else "lift_ban",
+                "group_id": group_id,
+                "operator_id": self._rng.choice(self.config.user_ids),
+                "user_id": user_id,
+                "duration": 60 if banned else 0,
+            }, None
+        raise ValueError(f"未知的事件类型: {kind}")
+
+    def _meta_event(self, meta_event_type: str) -> dict:
+        event = {"time": int(time.time()), "self_id": self.config.self_id, "post_type": "meta_event"}
+        if meta_event_type == "lifecycle":
+            event.update(meta_event_type="lifecycle", sub_type="connect")
+        else:
+            event.update(
+                meta_event_type="heartbeat",
+                status={"online": True, "good": True},
+                interval=int(self.config.heartbeat_interval * 1000),
+            )
+        return event
+
+    # ---------------- 请求应答 ----------------
+
+    def _action_data(self, action: str, params: dict) -> Any:
+        if action == "get_login_info":
+            return {"user_id": self.config.self_id, "nickname": "压测机器人"}
+        if action in ("get_group_info", "get_group_detail_info"):
+            group_id = params.get("group_id")
+            return {
+                "group_id": group_id,
+                "group_name": f"压测群{group_id}",
+                "member_count": 100,
+                "max_member_count": 500,
+            }
+        if action == "get_group_member_info":
+            user_id = params.get("user_id")
+            return {
+                "group_id": params.get("group_id"),
+                "user_id": user_id,
+                "nickname": f"用户{user_id}",
+                "card": "",
+                "role": "member",
+                "is_robot": False,
+                "shut_up_timestamp": 0,
+            }
+        if action == "get_stranger_info":
+            user_id = params.get("user_id")
+            return {"user_id": user_id, "nickname": f"用户{user_id}"}
+        if action == "get_msg":
+            return self._recent_messages.get(int(params.get("message_id", 0)))
+        if action == "get_forward_msg":
+            return {"messages": self._forward_contents.get(str(params.get("message_id")), [])}
+        if action in ("send_group_msg", "send_private_msg", "send_msg"):
+            message = params.get("message") or []
+            if isinstance(message, str):
+                message = [{"type": "text", "data": {"text": message}}]  # 工具调用可能直接发送字符串消息
+            for segment in message:
+                text = (segment.get("data") or {}).get("text")
+                if text and (seq := find_marker(text)) is not None and self.on_reply:
+                    self.on_reply(seq, action)
+                    break
+            return {"message_id": self._next_message_id()}
+        return {}
+
+    async def _answer(self, websocket, request: dict) -> None:
+        action = request.get("action")
+        self.actions[action] += 1
+        await asyncio.sleep(self._rng.uniform(self.config.min_latency, self.config.max_latency))
+        data = self._action_data(action, request.get("params") or {})
+        response = {
+            "status": "ok" if data is not None else "failed",
+            "retcode": 0 if data is not None else 1200,
+            "data": data,
+            "message": "",
+            "wording": "",
+            "echo": request.get("echo"),
+        }
+        try:
+            await websocket.send(json.dumps(response, ensure_ascii=False))
+        except websockets.ConnectionClosed:
+            pass
+
+    async def _serve_actions(self, websocket) -> None:
+        async for raw in websocket:
+            request = json.loads(raw)
+            task = asyncio.create_task(self._answer(websocket, request))
+            self._pending_actions.add(task)
+            task.add_done_callback(self._pending_actions.discard)
+
+    # ---------------- 发送事件 ----------------
+
+    async def _emit_events(self, websocket, duration: float) -> None:
+        kinds = [kind for kind in EVENT_KINDS if self.config.mix.get(kind, 0) > 0]
+        weights = [self.config.mix[kind] for kind in kinds]
+        interval = 1 / self.config.rate
+        start = time.perf_counter()
+        last_heartbeat = start
+        sent = 0
+        while (now := time.perf_counter()) - start < duration:
+            if now - last_heartbeat >= self.config.heartbeat_interval:
+                await websocket.send(json.dumps(self._meta_event("heartbeat")))
+                last_heartbeat = now
+            kind = self._rng.choices(kinds, weights)[0]
+            event, seq = self.build_event(kind)
+            if seq is not None and self.on_emit:
+                self.on_emit(seq, kind)
+            await websocket.send(json.dumps(event, ensure_ascii=False))
+            self.emitted[kind] += 1
+            sent += 1
+            # 按总发送数对齐时间，避免sleep误差累积导致速率偏低
+            delay = start + sent * interval - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+    async def run(self, url: str, duration: float, drain: float = 5.0) -> None:
+        """
+        连接adapter并发送事件
+        Parameters:
+            url: adapter的WebSocket地址
+            duration: 发送事件的时长，单位为秒
+            drain: 发送结束后继续应答请求的时长，单位为秒
+        """
+        async with websockets.connect(url, max_size=2**26) as websocket:
+            await websocket.send(json.dumps(self._meta_event("lifecycle")))
+            serve_task = asyncio.create_task(self._serve_actions(websocket))
+            try:
+                await self._emit_events(websocket, duration)
+                await asyncio.sleep(drain)
+            finally:
+                serve_task.cancel()
+                for task in list(self._pending_actions):
+                    task.cancel()
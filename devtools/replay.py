@@ -0,0 +1,253 @@
+"""
+流量回放
+
+读取由 debug.capture_file 记录的流量文件，把其中Napcat发来的事件与MaiBot发来的消息
+按原始节奏（可加速）重新交给 message_handler、notice_handler 与 send_handler 处理，
+adapter发起的请求由记录中的响应应答，发往MaiBot的消息只计数不发送。
+用于在真实流量模式下对比改动前后的处理耗时。
+
+回放会真实执行处理逻辑，包括写入数据库（禁言记录、机器人判定等），建议在插件目录的副本中运行。
+
+运行方式（MaiBot根目录）：
+python -m plugins.napcat_plugin.devtools.replay data/capture.jsonl.gz --speed 10
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import time
+from collections import Counter, defaultdict, deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Tuple
+
+import websockets as Server
+
+from plugins.napcat_plugin.ada.config import global_config
+from plugins.napcat_plugin.ada.event_dispatcher import EventDispatcher
+from plugins.napcat_plugin.ada.frame_router import peek_frame
+from plugins.napcat_plugin.ada.recv_handler.message_handler import message_handler
+from plugins.napcat_plugin.ada.recv_handler.message_sending import message_send_instance
+from plugins.napcat_plugin.ada.recv_handler.meta_event_handler import meta_event_handler
+from plugins.napcat_plugin.ada.recv_handler.notice_handler import notice_handler
+from plugins.napcat_plugin.ada.response_pool import put_response
+from plugins.napcat_plugin.ada.send_handler import send_handler
+from plugins.napcat_plugin.devtools.bench_response_pool import percentile
+
+
+@dataclass
+class CaptureRecord:
+    t: float
+    """记录时的时间戳"""
+    dir: str
+    """in / out / maibot"""
+    frame: str
+
+
+def load_capture(path: str) -> List[CaptureRecord]:
+    opener = gzip.open if path.endswith(".gz") else open
+    records: List[CaptureRecord] = []
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                records.append(CaptureRecord(record["t"], record["dir"], record["frame"]))
+    records.sort(key=lambda record: record.t)
+    return records
+
+
+def request_key(action: str, params: dict) -> Tuple[str, str]:
+    return action, json.dumps(params, sort_keys=True, ensure_ascii=False)
+
+
+class ResponseBook:
+    """
+    记录中的请求与响应
+
+    回放时请求的echo与记录中不同，按(action, params)匹配记录中的响应，
+    同一请求出现多次时按记录顺序依次返回；参数不同的请求退而使用同一action的任一响应。
+    """
+
+    def __init__(self, records: List[CaptureRecord]):
+        requests: Dict[str, Tuple[float, dict]] = {}
+        responses: Dict[str, Tuple[float, dict]] = {}
+        for record in records:
+            if record.dir == "out":
+                request = json.loads(record.frame)
+                requests[request.get("echo")] = (record.t, request)
+            elif record.dir == "in" and (echo := peek_frame(record.frame).echo) is not None:
+                responses[echo] = (record.t, json.loads(record.frame))
+
+        self.exact: Dict[Tuple[str, str], Deque[Tuple[float, dict]]] = defaultdict(deque)
+        self.by_action: Dict[str, Tuple[float, dict]] = {}
+        for echo, (sent_at, request) in requests.items():
+            if echo not in responses:
+                continue
+            received_at, response = responses[echo]
+            entry = (received_at - sent_at, response)
+            action = request.get("action")
+            self.exact[request_key(action, request.get("params") or {})].append(entry)
+            self.by_action.setdefault(action, entry)
+        self.matched: Counter[str] = Counter()
+        self.fallback: Counter[str] = Counter()
+        self.missing: Counter[str] = Counter()
+
+    def lookup(self, action: str, params: dict) -> Tuple[float, dict]:
+        """返回记录中的响应延迟（秒）与响应"""
+        entries = self.exact.get(request_key(action, params))
+        if entries:
+            self.matched[action] += 1
+            # 最后一条保留，供之后的相同请求重复使用
+            return entries.popleft() if len(entries) > 1 else entries[0]
+        if action in self.by_action:
+            self.fallback[action] += 1
+            return self.by_action[action]
+        self.missing[action] += 1
+        return 0.0, {"status": "failed", "retcode": 1404, "data": None, "message": "记录中没有该请求的响应"}
+
+
+class ReplayConnection:
+    """代替Napcat连接，从记录中应答请求"""
+
+    state = Server.State.OPEN
+
+    def __init__(self, book: ResponseBook, speed: float):
+        self.book = book
+        self.speed = speed
+        self._tasks: set[asyncio.Task] = set()
+
+    async def send(self, payload: str) -> None:
+        request = json.loads(payload)
+        latency, response = self.book.lookup(request.get("action"), request.get("params") or {})
+        task = asyncio.create_task(self._respond(latency, {**response, "echo": request.get("echo")}))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _respond(self, latency: float, response: dict) -> None:
+        if self.speed > 0:
+            await asyncio.sleep(latency / self.speed)
+        await put_response(response)
+
+
+class ReplaySink:
+    """代替MaiBot路由，只统计发出的消息"""
+
+    def __init__(self):
+        self.sent: Counter[str] = Counter()
+
+    async def send_message(self, message_base) -> bool:
+        self.sent[message_base.message_segment.type] += 1
+        return True
+
+
+async def handle_event(event: dict) -> None:
+    post_type = event.get("post_type")
+    if post_type == "message":
+        await message_handler.handle_raw_message(event)
+    elif post_type == "meta_event":
+        await meta_event_handler.handle_meta_event(event)
+    elif post_type == "notice":
+        await notice_handler.handle_notice(event)
+
+
+def build_schedule(records: List[CaptureRecord], speed: float, max_gap: float) -> List[Tuple[float, CaptureRecord]]:
+    """计算每条待回放记录相对回放开始的时间，超过max_gap的空闲被压缩"""
+    schedule: List[Tuple[float, CaptureRecord]] = []
+    offset = 0.0
+    previous: Optional[float] = None
+    for record in records:
+        if record.dir == "out" or (record.dir == "in" and peek_frame(record.frame).echo is not None):
+            continue  # 请求与响应由ReplayConnection处理
+        if previous is not None:
+            offset += min(record.t - previous, max_gap)
+        previous = record.t
+        schedule.append((offset / speed if speed > 0 else 0.0, record))
+    return schedule
+
+
+async def replay(args: argparse.Namespace) -> None:
+    records = load_capture(args.capture)
+    book = ResponseBook(records)
+    schedule = build_schedule(records, args.speed, args.max_gap)
+    print(
+        f"读取记录 {len(records)} 条，待回放 {len(schedule)} 条，可应答的请求 {sum(map(len, book.exact.values()))} 个"
+    )
+
+    connection = ReplayConnection(book, args.speed)
+    sink = ReplaySink()
+    message_send_instance.maibot_router = sink
+    await message_handler.set_server_connection(connection)
+    await meta_event_handler.set_server_connection(connection)
+    await send_handler.set_server_connection(connection)
+    background = [asyncio.create_task(notice_handler.set_server_connection(connection))]
+
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    feed_times: Dict[int, float] = {}
+
+    async def timed_handle_event(event: dict) -> None:
+        try:
+            await handle_event(event)
+        finally:
+            latencies[event.get("post_type")].append((time.perf_counter() - feed_times.pop(id(event))) * 1000)
+
+    async def timed_handle_maibot(message: dict, fed_at: float) -> None:
+        try:
+            await send_handler.handle_message(message)
+        finally:
+            latencies["maibot"].append((time.perf_counter() - fed_at) * 1000)
+
+    dispatcher = EventDispatcher(global_config.dispatch.worker_count)
+    background.append(asyncio.create_task(dispatcher.run(timed_handle_event)))
+    maibot_tasks: List[asyncio.Task] = []
+
+    start = time.perf_counter()
+    for due, record in schedule:
+        if (delay := start + due - time.perf_counter()) > 0:
+            await asyncio.sleep(delay)
+        elif args.speed <= 0:
+            await asyncio.sleep(0)  # 最大速度下也让出事件循环，与真实接收循环一致
+        message = json.loads(record.frame)
+        if record.dir == "maibot":
+            maibot_tasks.append(asyncio.create_task(timed_handle_maibot(message, time.perf_counter())))
+        else:
+            feed_times[id(message)] = time.perf_counter()
+            await dispatcher.put(message)
+    feed_elapsed = time.perf_counter() - start
+
+    await asyncio.gather(*(shard.join() for shard in dispatcher.shards))
+    await asyncio.gather(*maibot_tasks, return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    for task in background:
+        task.cancel()
+    await asyncio.gather(*background, return_exceptions=True)
+
+    processed = sum(len(samples) for samples in latencies.values())
+    print("\n===== 回放结果 =====")
+    print(f"投递耗时 {feed_elapsed:.2f}s，处理完成耗时 {elapsed:.2f}s，{processed / elapsed:.1f} 条/秒")
+    for kind, samples in sorted(latencies.items()):
+        print(
+            f"  {kind:<10} {len(samples):6d} 条  p50 {percentile(samples, 50):8.1f}ms  "
+            f"p90 {percentile(samples, 90):8.1f}ms  p99 {percentile(samples, 99):8.1f}ms  max {max(samples):8.1f}ms"
+        )
+    print(f"按记录应答的请求: {dict(book.matched)}")
+    if book.fallback:
+        print(f"参数不同、使用同类响应应答的请求: {dict(book.fallback)}")
+    if book.missing:
+        print(f"记录中没有响应的请求: {dict(book.missing)}")
+    print(f"发往MaiBot的消息: {dict(sink.sent)}")
+    dropped = sum(dispatcher.shed_counts().values())
+    if dropped:
+        print(f"队列已满被丢弃的事件: {dispatcher.shed_counts()}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="回放Napcat流量记录")
+    parser.add_argument("capture", help="流量记录文件，由配置中的debug.capture_file生成")
+    parser.add_argument("--speed", type=float, default=1, help="回放倍速，1为原速，0为不等待、尽快回放")
+    parser.add_argument("--max-gap", type=float, default=5, help="相邻记录间的最长等待时间（按原速计，秒）")
+    args = parser.parse_args()
+    asyncio.run(replay(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -7,8 +7,8 @@ NapCat QQ协议插件 - 提供完整的QQ机器人API接口
 
 from typing import List, Tuple, Type, Any, Dict
 import asyncio
-import json
 import sys
+import time
 import websockets as Server
 from src.common.logger import get_logger
 from src.plugin_system import (
@@ -19,7 +19,7 @@ from src.plugin_system import (
 
 from plugins.napcat_plugin.utils import (
     MessageUtils, GroupUtils,
-    FriendUtils, FileUtils, MessageOpsUtils
+    FriendUtils, FileUtils, MessageOpsUtils, StatsUtils, BatchUtils
 )
 from plugins.napcat_plugin.server_manager import server_manager
 
@@ -29,7 +29,18 @@ from plugins.napcat_plugin.ada.recv_handler.notice_handler import notice_handler
 from plugins.napcat_plugin.ada.recv_handler.message_sending import message_send_instance
 from plugins.napcat_plugin.ada.send_handler import send_handler
 from plugins.napcat_plugin.ada.mmc_com_layer import mmc_start_com, mmc_stop_com, router
-from plugins.napcat_plugin.ada.response_pool import put_response, check_timeout_response
+from plugins.napcat_plugin.ada.response_pool import put_response, check_timeout_response, has_pending_response
+from plugins.napcat_plugin.ada.frame_router import peek_frame, json_loads
+from plugins.napcat_plugin.ada.http_client import media_downloader
+from plugins.napcat_plugin.ada.utils import shutdown_image_executor
+from plugins.napcat_plugin.ada.config import global_config
+from plugins.napcat_plugin.ada.event_dispatcher import EventDispatcher
+from plugins.napcat_plugin.ada.logger import logger as adapter_logger, sampled_logger, truncate
+from plugins.napcat_plugin.ada.traffic_recorder import traffic_recorder
+from plugins.napcat_plugin.ada.rpc_metrics import handler_metrics
+from plugins.napcat_plugin.ada.diagnostics import DiagnosticsServer, log_stats_periodically
+from plugins.napcat_plugin.ada.tracing import Trace
+from plugins.napcat_plugin.ada.connection_supervisor import connection_supervisor
 
 logger = get_logger("napcat_plugin")
 
@@ -39,41 +50,92 @@ class NapcatAdapter:
     def __init__(self, host: str = "127.0.0.1", port: int = 8000):
         self.port = port
         self.host = host
-        self.message_queue = asyncio.Queue()
+        self.dispatcher = EventDispatcher(global_config.dispatch.worker_count)
 
     async def message_recv(self, server_connection: Server.ServerConnection):
         await message_handler.set_server_connection(server_connection)
+        await meta_event_handler.set_server_connection(server_connection)
         asyncio.create_task(notice_handler.set_server_connection(server_connection))
         await send_handler.set_server_connection(server_connection)
+        connection_supervisor.attach(server_connection)
+        try:
+            await self._recv_loop(server_connection)
+        except Server.ConnectionClosed:
+            pass  # 断开原因由connection_supervisor记录
+        finally:
+            connection_supervisor.detach(server_connection)
+
+    async def _recv_loop(self, server_connection: Server.ServerConnection):
         async for raw_message in server_connection:
-            logger.debug(f"{raw_message[:1500]}..." if (len(raw_message) > 1500) else raw_message)
-            decoded_raw_message: dict = json.loads(raw_message)
+            received_at = time.perf_counter()
+            traffic_recorder.record("in", raw_message)
+            sampled_logger.debug("raw_frame", "{}", lambda raw=raw_message: truncate(raw))
+            # 先读取路由字段，能确定无需处理的帧不做完整解码
+            peek = peek_frame(raw_message)
+            if peek.echo is not None and not has_pending_response(peek.echo):
+                sampled_logger.debug("late_response", "响应 {} 已无人等待，直接丢弃", lambda echo=peek.echo: echo)
+                continue
+            if peek.group_id is not None and not message_handler.is_group_allowed(peek.group_id):
+                continue
+            peeked_at = time.perf_counter()
+            decoded_raw_message: dict = json_loads(raw_message)
             post_type = decoded_raw_message.get("post_type")
             if post_type in ["meta_event", "message", "notice"]:
-                await self.message_queue.put(decoded_raw_message)
+                label = f"message_id={decoded_raw_message.get('message_id')}" if post_type == "message" else ""
+                trace = Trace(post_type, received_at, label)
+                trace.mark("receive", peeked_at)
+                trace.mark("decode")
+                if post_type == "meta_event":
+                    meta_event_handler.record_heartbeat(decoded_raw_message)
+                await self.dispatcher.put(decoded_raw_message, trace)
             elif post_type is None:
                 await put_response(decoded_raw_message)
 
 
     async def message_process(self):
-        while True:
-            message = await self.message_queue.get()
-            post_type = message.get("post_type")
-            if post_type == "message":
-                await message_handler.handle_raw_message(message)
-            elif post_type == "meta_event":
-                await meta_event_handler.handle_meta_event(message)
-            elif post_type == "notice":
-                await notice_handler.handle_notice(message)
-            else:
-                logger.warning(f"未知的post_type: {post_type}")
-            self.message_queue.task_done()
-            await asyncio.sleep(0.05)
+        """启动按会话分片的处理worker，同一会话内保持顺序，不同会话并行处理"""
+        await self.dispatcher.run(self.handle_event)
+
+    async def handle_event(self, message: dict):
+        post_type = message.get("post_type")
+        handler_metrics.begin(post_type)
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            await self._handle_event(post_type, message)
+            outcome = "ok"
+        finally:
+            handler_metrics.end(post_type, time.perf_counter() - start, outcome)
+
+    async def _handle_event(self, post_type: str, message: dict):
+        if post_type == "message":
+            await message_handler.handle_raw_message(message)
+        elif post_type == "meta_event":
+            await meta_event_handler.handle_meta_event(message)
+        elif post_type == "notice":
+            await notice_handler.handle_notice(message)
+        else:
+            logger.warning(f"未知的post_type: {post_type}")
+
+    def queue_depths(self) -> Dict[int, int]:
+        """获取每个分片当前积压的事件数"""
+        return self.dispatcher.queue_depths()
 
 
     async def main(self):
         message_send_instance.maibot_router = router
-        _ = await asyncio.gather(self.napcat_server(), mmc_start_com(), self.message_process(), check_timeout_response())
+        if global_config.debug.capture_file:
+            traffic_recorder.open(global_config.debug.capture_file)
+        tasks = [
+            self.napcat_server(),
+            mmc_start_com(),
+            self.message_process(),
+            check_timeout_response(),
+            log_stats_periodically(),
+        ]
+        if global_config.diagnostics.enable:
+            tasks.append(DiagnosticsServer(self).run())
+        _ = await asyncio.gather(*tasks)
 
 
     async def napcat_server(self):
@@ -88,12 +150,17 @@ class NapcatAdapter:
     async def graceful_shutdown(self):
         try:
             logger.info("正在关闭adapter...")
+            connection_supervisor.close()
             tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
             for task in tasks:
                 if not task.done():
                     task.cancel()
             await asyncio.wait_for(asyncio.gather(*tasks, return_exceptions=True), 15)
             await mmc_stop_com()  # 后置避免神秘exception
+            await media_downloader.close()
+            shutdown_image_executor()
+            traffic_recorder.close()
+            await adapter_logger.complete()  # 等待队列中的日志写出
             logger.info("Adapter已成功关闭")
         except Exception as e:
             logger.error(f"Adapter关闭中出现错误: {e}")
@@ -122,8 +189,11 @@ class NapCatTool(BaseTool):
         ("action", ToolParamType.STRING, 
          "操作类型: send_message, get_groups, get_group_members, get_friends, upload_file, "
          "group_sign, group_poke, friend_poke, get_file_info, get_friends_with_category, "
-         "get_message, forward_message", True, None),
-        ("params", ToolParamType.DICT, "操作参数，根据action类型提供不同参数", True, None),
+         "get_message, forward_message, get_rpc_stats, batch", True, None),
+        ("params", ToolParamType.DICT, "操作参数，根据action类型提供不同参数；batch的参数为 "
+         "{\"requests\": [{\"action\": 只读的Napcat接口名（get_开头）, \"params\": 参数}, ...], "
+         "\"concurrency\": 同时进行的请求数, \"timeout\": 单个请求的超时秒数}",
+         True, None),
     ]
     available_for_llm = False
     
@@ -150,6 +220,8 @@ class NapCatTool(BaseTool):
                 "get_friends_with_category": FriendUtils.get_friends_with_category,
                 "get_message": MessageOpsUtils.get_message,
                 "forward_message": MessageOpsUtils.forward_message,
+                "get_rpc_stats": StatsUtils.get_rpc_stats,
+                "batch": BatchUtils.batch,
             }
             
             handler = tool_map.get(action)
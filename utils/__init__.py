@@ -10,6 +10,8 @@ from plugins.napcat_plugin.utils.group_utils import GroupUtils
 from plugins.napcat_plugin.utils.friend_utils import FriendUtils
 from plugins.napcat_plugin.utils.file_utils import FileUtils
 from plugins.napcat_plugin.utils.message_ops_utils import MessageOpsUtils
+from plugins.napcat_plugin.utils.stats_utils import StatsUtils
+from plugins.napcat_plugin.utils.batch_utils import BatchUtils
 
 __all__ = [
     'adapter_client',
@@ -17,5 +19,7 @@ __all__ = [
     'GroupUtils',
     'FriendUtils',
     'FileUtils',
-    'MessageOpsUtils'
+    'MessageOpsUtils',
+    'StatsUtils',
+    'BatchUtils'
 ]
\ No newline at end of file
@@ -0,0 +1,80 @@
+from typing import Dict, Any, Optional
+from plugins.napcat_plugin.adapter_client import adapter_client
+from plugins.napcat_plugin.ada.connection_supervisor import is_idempotent
+
+MAX_BATCH_SIZE = 100
+"""单次批量请求最多包含的请求数"""
+MAX_BATCH_CONCURRENCY = 32
+"""单次批量请求同时等待响应的请求数上限"""
+MAX_BATCH_TIMEOUT = 60
+"""单个请求的超时时间上限（秒）"""
+
+
+def _bounded_number(value: Any, default: float, lower: float, upper: float) -> Optional[float]:
+    """将参数限制在[lower, upper]内，未提供时使用default，不是数字时返回None"""
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    if number != number:  # NaN
+        return None
+    return min(max(number, lower), upper)
+
+
+class BatchUtils:
+    """批量请求工具类 - 在一次调用中执行多个Napcat请求"""
+
+    @staticmethod
+    async def batch(params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        批量执行Napcat请求
+
+        requests为 [{"action": Napcat接口名, "params": 参数}, ...]，请求连续发出后并发等待响应，
+        结果按请求顺序返回，单个请求失败不影响其他请求。
+        只允许只读查询（get_开头等），发送消息、踢人、撤回等写操作请使用对应的专用工具
+        """
+        requests = params.get("requests")
+        if not isinstance(requests, list) or not requests:
+            return {"content": "缺少必要参数: requests", "success": False}
+        if len(requests) > MAX_BATCH_SIZE:
+            return {"content": f"单次最多批量执行{MAX_BATCH_SIZE}个请求", "success": False}
+        if not all(isinstance(item, dict) and item.get("action") for item in requests):
+            return {"content": "requests中的每一项都必须包含action", "success": False}
+        if not_allowed := sorted({str(item["action"]) for item in requests if not is_idempotent(str(item["action"]))}):
+            return {"content": f"批量请求只支持只读查询，不支持: {', '.join(not_allowed)}", "success": False}
+        concurrency = _bounded_number(params.get("concurrency"), 16, 1, MAX_BATCH_CONCURRENCY)
+        if concurrency is None:
+            return {"content": "concurrency必须是数字", "success": False}
+        timeout = _bounded_number(params.get("timeout"), 10, 1, MAX_BATCH_TIMEOUT)
+        if timeout is None:
+            return {"content": "timeout必须是数字", "success": False}
+
+        try:
+            results = await adapter_client.send_batch(
+                [(item["action"], item.get("params") or {}) for item in requests],
+                concurrency=int(concurrency),
+                timeout=timeout,
+            )
+        except Exception as e:
+            return {"content": f"批量请求失败: {str(e)}", "success": False}
+
+        items = []
+        for result in results:
+            item = {"action": result.action, "success": result.ok}
+            if result.error is not None:
+                item["error"] = str(result.error) or type(result.error).__name__
+            elif result.ok:
+                item["data"] = result.data
+            else:
+                item["error"] = result.response.get("msg") or result.response.get("message") or "未知错误"
+            items.append(item)
+        succeeded = sum(item["success"] for item in items)
+        return {
+            "content": f"批量请求完成，成功{succeeded}个，失败{len(items) - succeeded}个",
+            "success": True,
+            "results": items,
+        }
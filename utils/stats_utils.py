@@ -0,0 +1,23 @@
+from typing import Dict, Any
+from plugins.napcat_plugin.ada.rpc_metrics import rpc_metrics, format_ms
+
+
+class StatsUtils:
+    """运行统计工具类 - 查询adapter内部的统计数据"""
+
+    @staticmethod
+    async def get_rpc_stats(params: Dict[str, Any]) -> Dict[str, Any]:
+        """获取Napcat请求统计，format为prometheus时返回Prometheus文本格式"""
+        if params.get("format") == "prometheus":
+            return {"content": rpc_metrics.render_prometheus(), "success": True}
+        stats = rpc_metrics.snapshot()
+        action = params.get("action")
+        if action:
+            stats = {action: stats[action]} if action in stats else {}
+        summary = "; ".join(
+            f"{name}: {item['requests']}次, p50 {format_ms(item['p50_ms'])}, p99 {format_ms(item['p99_ms'])}, "
+            f"超时{item['timeout']}次, 断线{item['disconnected']}次, 失败{item['failed'] + item['error']}次, "
+            f"在途{item['in_flight']}"
+            for name, item in stats.items()
+        )
+        return {"content": f"Napcat请求统计: {summary or '暂无请求'}", "success": True, "stats": stats}